@@ -3,40 +3,105 @@ Oasis-Nav - 轻量级导航页后端
 Flask + SQLite 方案
 """
 
-from flask import Flask, request, jsonify, render_template, send_from_directory, session, Response
+from flask import Flask, request, jsonify, render_template, send_from_directory, session, Response, g, has_request_context, stream_with_context
+from markupsafe import Markup
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
 from urllib.parse import urlparse
+from html.parser import HTMLParser
 import sqlite3
+import threading
+import queue
+import time
 import secrets
 import os
 import re
 import hashlib
+import base64
+import codecs
+import html
+import gzip
+
+try:
+    import fcntl
+except ImportError:  # Windows 本地开发
+    fcntl = None
+try:
+    from PIL import Image
+except ImportError:  # 未安装 Pillow 时图标规整只处理 ICO 帧
+    Image = None
+import io
+import struct
+import tempfile
+import json
+import heapq
+import multiprocessing
 import requests
-from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+from http.cookiejar import DefaultCookiePolicy
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
 app.secret_key = secrets.token_hex(32)  # 每次启动随机生成，重启后登录失效
 
-# CSRF Token 存储
-csrf_tokens = {}
-
 # 配置（支持环境变量，便于 Docker 部署）
 DATABASE = os.environ.get('DATABASE_PATH', 'data.db')
+# SQLite 连接参数（每个新连接创建时设置）
+SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'wal').lower()  # wal 模式下读写互不阻塞
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'normal').lower()
+SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', '-8000'))  # 负数表示 KiB，正数表示页数
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', str(64 * 1024 * 1024)))  # 内存映射读取的字节数，0 关闭
+SQLITE_TEMP_STORE = os.environ.get('SQLITE_TEMP_STORE', 'memory').lower()
+SQLITE_CHECKPOINT_INTERVAL = int(os.environ.get('SQLITE_CHECKPOINT_INTERVAL', '300'))  # WAL 检查点间隔（秒）
+INDEX_INLINE_DATA = os.environ.get('INDEX_INLINE_DATA', '1') == '1'  # 首页内嵌首屏数据，无需再请求接口
 
 # 图标缓存配置
 ICON_CACHE_DIR = os.environ.get('ICON_CACHE_DIR', 'icon_cache')
 ICON_CACHE_EXPIRE_DAYS = 7  # 缓存过期天数
-
-# Token 存储 (简单实现，生产环境建议用 Redis)
-# 结构: {token: {'expires': datetime, 'ip': str}}
-active_tokens = {}
+ICON_MAX_BYTES = 1024 * 1024  # 单个图标大小上限（1MB）
+# 磁盘缓存后端: files（每个图标一个 .ico + .meta 文件）/ sqlite（单文件 icons.db）
+ICON_CACHE_BACKEND = os.environ.get('ICON_CACHE_BACKEND', 'files')
+ICON_CACHE_MAX_STALE_DAYS = int(os.environ.get('ICON_CACHE_MAX_STALE_DAYS', '30'))  # 过期后仍可返回旧图标的最长天数
+ICON_REFRESH_WORKERS = int(os.environ.get('ICON_REFRESH_WORKERS', '2'))  # 后台刷新线程数
+ICON_REFRESH_MAX_PENDING = 200  # 后台刷新队列上限，超出时不再排队（下次访问时再刷新）
+ICON_WARMUP_WORKERS = int(os.environ.get('ICON_WARMUP_WORKERS', '2'))  # 预热并发数
+ICON_WARMUP_ON_START = os.environ.get('ICON_WARMUP_ON_START', '1') == '1'  # 启动时预热所有链接图标
+ICON_BATCH_MAX_URLS = 500  # 批量接口单次最多图标数
+ICON_BATCH_MAX_ICON_BYTES = 64 * 1024  # 批量接口内联的单个图标上限，更大的走单独代理
+ICON_NEGATIVE_TTL = 60  # 上游失败的初始缓存时间（秒），连续失败时翻倍
+ICON_NEGATIVE_MAX_TTL = 3600  # 上游失败的最长缓存时间（秒）
+ICON_CACHE_MAX_BYTES = int(os.environ.get('ICON_CACHE_MAX_BYTES', str(100 * 1024 * 1024)))  # 磁盘缓存字节上限
+ICON_CACHE_GC_INTERVAL = int(os.environ.get('ICON_CACHE_GC_INTERVAL', '3600'))  # 缓存回收间隔（秒）
+ICON_ORPHAN_GRACE = 86400  # 不属于任何链接的图标保留时长（秒）
+ICON_ACCESS_RESOLUTION = 3600  # 访问时间的记录精度（秒），避免每次命中都写磁盘
+ICON_NORMALIZE = os.environ.get('ICON_NORMALIZE', '0') == '1'  # 缓存前缩小并转码图标
+ICON_NORMALIZE_SIZE = int(os.environ.get('ICON_NORMALIZE_SIZE', '64'))  # 规整后的最大边长（像素）
+ICON_NORMALIZE_FORMAT = os.environ.get('ICON_NORMALIZE_FORMAT', 'png').lower()  # png / webp（需要 Pillow）
+ICON_NORMALIZE_MAX_PIXELS = 4096 * 4096  # 超过该像素数的图片不解码（防止小文件声明巨大尺寸耗尽内存）
+ICON_MEMORY_CACHE_BYTES = int(os.environ.get('ICON_MEMORY_CACHE_BYTES', str(8 * 1024 * 1024)))  # 内存缓存字节上限
+
+# 图标上游连接池配置
+ICON_HTTP_POOL_HOSTS = int(os.environ.get('ICON_HTTP_POOL_HOSTS', '10'))  # 保持连接池的主机数
+ICON_HTTP_POOL_SIZE = int(os.environ.get('ICON_HTTP_POOL_SIZE', '10'))  # 每个主机的最大连接数
+ICON_CONNECT_TIMEOUT = float(os.environ.get('ICON_CONNECT_TIMEOUT', '3'))  # 连接超时（秒）
+ICON_READ_TIMEOUT = float(os.environ.get('ICON_READ_TIMEOUT', '10'))  # 读取超时（秒）
+
+# Token 存储后端: memory（单进程）/ sqlite / redis（多 worker 共享）
+TOKEN_STORE = os.environ.get('TOKEN_STORE', 'memory')
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+TOKEN_STORE_MAX_ENTRIES = int(os.environ.get('TOKEN_STORE_MAX_ENTRIES', '10000'))  # 每个命名空间的条目上限，超出按 LRU 淘汰
+TOKEN_SWEEP_INTERVAL = int(os.environ.get('TOKEN_SWEEP_INTERVAL', '60'))  # 过期清理间隔（秒）
 
 # 登录失败计数器（防暴力破解）
-login_attempts = {}  # {ip: {'count': 0, 'locked_until': datetime}}
 MAX_LOGIN_ATTEMPTS = 5  # 最大尝试次数
 LOCKOUT_DURATION = 15  # 锁定时间（分钟）
 
+# 密码校验进程池（PBKDF2 计算不阻塞请求线程，超出排队上限直接返回 429）
+HASH_POOL_WORKERS = int(os.environ.get('HASH_POOL_WORKERS', '2'))
+HASH_POOL_MAX_PENDING = int(os.environ.get('HASH_POOL_MAX_PENDING', '8'))
+
 def get_client_ip():
     """获取真实客户端 IP（支持反向代理）"""
     # 优先从 X-Forwarded-For 获取（Nginx 转发）
@@ -51,16 +116,274 @@ def get_client_ip():
     # 最后使用 remote_addr（直接访问或没有配置 Nginx）
     return request.remote_addr
 
+class ConnectionPool:
+    """SQLite 连接池：复用长连接，连接创建时一次性设置 PRAGMA"""
+
+    def __init__(self, database, max_size=10, timeout=10, pragmas=None):
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pragmas = pragmas or {}
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # fork 后（gunicorn preload）子进程不能复用父进程的连接
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._dir_checked = False
+
+    def _connect(self):
+        """创建新连接"""
+        if not self._dir_checked:
+            # 确保数据库目录存在（Docker 挂载卷时可能为空）
+            db_dir = os.path.dirname(self.database)
+            if db_dir and not os.path.exists(db_dir):
+                os.makedirs(db_dir, mode=0o755, exist_ok=True)
+            self._dir_checked = True
+
+        # 连接由连接池保证同一时刻只被一个线程使用
+        conn = sqlite3.connect(self.database, timeout=self.timeout, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f'PRAGMA busy_timeout = {int(self.timeout * 1000)}')
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def checkout(self):
+        """取出一个连接（池空且已达上限时等待）"""
+        start = time.monotonic()
+        waited = False
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            self._checkouts += 1
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = None
+                if self._created < self.max_size:
+                    self._created += 1
+                    create = True
+                else:
+                    create = False
+                    waited = True
+                    self._waits += 1
+
+        if conn is None:
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise sqlite3.OperationalError('数据库连接池已耗尽')
+
+        elapsed = time.monotonic() - start
+        with self._lock:
+            self._in_use += 1
+            if waited:
+                self._wait_time += elapsed
+                self._max_wait = max(self._max_wait, elapsed)
+        return PooledConnection(self, conn)
+
+    def checkin(self, conn):
+        """归还连接，回滚未提交的事务"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # 连接已损坏，丢弃并允许重新创建
+            with self._lock:
+                self._in_use -= 1
+                self._created -= 1
+            conn.close()
+            return
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(conn)
+
+    def stats(self):
+        """连接池统计"""
+        with self._lock:
+            return {
+                'size': self._created,
+                'max_size': self.max_size,
+                'in_use': self._in_use,
+                'idle': self._idle.qsize(),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'avg_wait_ms': round(self._wait_time / self._waits * 1000, 3) if self._waits else 0,
+                'max_wait_ms': round(self._max_wait * 1000, 3),
+            }
+
+class PooledConnection:
+    """连接代理：close() 时归还到连接池而不是真正关闭"""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+        if has_request_context():
+            # 请求结束时兜底归还（处理异常路径忘记 close 的情况）
+            g.setdefault('_db_conns', []).append(self)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.checkin(conn)
+
+class PeriodicTask:
+    """后台周期任务（守护线程，fork 后在子进程中重新启动）"""
+
+    def __init__(self, name, interval, func):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self._pid = None
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.errors = 0
+        self.last_duration_ms = 0.0
+
+    def ensure_running(self):
+        """确保当前进程中线程已启动"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name=self.name, daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.run_once()
+
+    def run_once(self):
+        """立即执行一次"""
+        start = time.monotonic()
+        try:
+            self.func()
+        except Exception as e:
+            self.errors += 1
+            print(f"后台任务 {self.name} 执行失败: {e}")
+        self.runs += 1
+        self.last_duration_ms = round((time.monotonic() - start) * 1000, 3)
+
+    def stats(self):
+        return {
+            'interval': self.interval,
+            'runs': self.runs,
+            'errors': self.errors,
+            'last_duration_ms': self.last_duration_ms,
+        }
+
+# 所有后台任务，在第一个请求到来时于当前进程中启动
+background_tasks = {}
+
+def register_background_task(name, interval, func):
+    """注册后台周期任务"""
+    task = PeriodicTask(name, interval, func)
+    background_tasks[name] = task
+    return task
+
+@app.before_request
+def start_background_tasks():
+    """确保后台任务在当前 worker 进程中运行"""
+    for task in background_tasks.values():
+        task.ensure_running()
+
+def build_sqlite_pragmas():
+    """校验并生成连接级 PRAGMA 设置"""
+    choices = {
+        'journal_mode': (SQLITE_JOURNAL_MODE, ('wal', 'delete', 'truncate', 'persist')),
+        'synchronous': (SQLITE_SYNCHRONOUS, ('off', 'normal', 'full', 'extra')),
+        'temp_store': (SQLITE_TEMP_STORE, ('default', 'file', 'memory')),
+    }
+    pragmas = {}
+    for name, (value, allowed) in choices.items():
+        if value not in allowed:
+            raise ValueError(f'未知的 SQLITE_{name.upper()}: {value}')
+        pragmas[name] = value.upper()
+    pragmas['cache_size'] = SQLITE_CACHE_SIZE
+    pragmas['mmap_size'] = SQLITE_MMAP_SIZE
+    return pragmas
+
+db_pool = ConnectionPool(
+    DATABASE,
+    max_size=int(os.environ.get('DB_POOL_SIZE', '10')),
+    timeout=10,  # 10秒超时，避免数据库锁定错误
+    pragmas=build_sqlite_pragmas()
+)
+
+def get_db_settings(pool=None):
+    """读取连接实际生效的设置（不支持的值会被 SQLite 忽略或回退）"""
+    conn = (pool or db_pool).checkout()
+    settings = {}
+    for name in ('journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store', 'busy_timeout'):
+        settings[name] = conn.execute(f'PRAGMA {name}').fetchone()[0]
+    conn.close()
+    settings['synchronous'] = ('OFF', 'NORMAL', 'FULL', 'EXTRA')[settings['synchronous']]
+    settings['temp_store'] = ('DEFAULT', 'FILE', 'MEMORY')[settings['temp_store']]
+    return settings
+
+def report_db_settings():
+    """启动时打印实际生效的数据库设置，WAL 未生效时给出提示"""
+    settings = get_db_settings()
+    print('SQLite 设置: ' + ', '.join(f'{name}={value}' for name, value in settings.items()))
+    if SQLITE_JOURNAL_MODE == 'wal' and settings['journal_mode'] != 'wal':
+        print(f"警告: WAL 模式未生效（当前 {settings['journal_mode']}），数据库所在文件系统可能不支持")
+    return settings
+
+wal_checkpoint_stats = {'last_result': None, 'checkpointed_pages': 0}
+
+def checkpoint_db():
+    """定期执行 WAL 检查点（PASSIVE 不阻塞读写），避免 -wal 文件持续增长"""
+    if SQLITE_JOURNAL_MODE != 'wal':
+        return
+    pools = [db_pool]
+    if isinstance(icon_store, SQLiteIconStore) and icon_store._pool is not None:
+        pools.append(icon_store._pool)
+    for pool in pools:
+        conn = pool.checkout()
+        busy, log_pages, checkpointed = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+        conn.close()
+        wal_checkpoint_stats['checkpointed_pages'] += max(checkpointed, 0)
+        if pool is db_pool:
+            wal_checkpoint_stats['last_result'] = {'busy': busy, 'log_pages': log_pages, 'checkpointed': checkpointed}
+
+register_background_task('wal-checkpoint', SQLITE_CHECKPOINT_INTERVAL, checkpoint_db)
+
 def get_db():
-    """获取数据库连接"""
-    # 确保数据库目录存在（Docker 挂载卷时可能为空）
-    db_dir = os.path.dirname(DATABASE)
-    if db_dir and not os.path.exists(db_dir):
-        os.makedirs(db_dir, mode=0o755, exist_ok=True)
-    
-    conn = sqlite3.connect(DATABASE, timeout=10)  # 10秒超时，避免数据库锁定错误
-    conn.row_factory = sqlite3.Row
-    return conn
+    """获取数据库连接（从连接池取出，close() 即归还）"""
+    return db_pool.checkout()
+
+@app.teardown_request
+def release_db_connections(exc):
+    """归还本次请求中未关闭的连接"""
+    for conn in g.pop('_db_conns', []):
+        conn.close()
 
 def init_db():
     """初始化数据库"""
@@ -113,6 +436,30 @@ def init_db():
         )
     ''')
     
+    # 创建 Token 表（TOKEN_STORE=sqlite 时使用）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tokens (
+            ns TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT,
+            expires REAL NOT NULL,
+            PRIMARY KEY (ns, key)
+        )
+    ''')
+    
+    # 创建版本计数表（跨进程缓存失效信号）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS versions (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    # 内容版本从当前时间起算，重建数据库后旧 ETag 不会被误判为未修改
+    cursor.execute(
+        "INSERT OR IGNORE INTO versions (name, value) VALUES ('content', ?)",
+        (int(time.time()),)
+    )
+    
     # 检查是否需要插入默认数据
     cursor.execute('SELECT COUNT(*) FROM categories')
     if cursor.fetchone()[0] == 0:
@@ -158,16 +505,220 @@ def init_db():
         print("已插入默认演示数据")
     
     conn.commit()
+    migrate_db(conn)
+    init_search_index(conn)
     conn.close()
 
+# 数据库迁移：(版本号, 说明, SQL 列表)，版本号记录在 PRAGMA user_version 中，只能追加
+MIGRATIONS = [
+    (1, '首页、分类与书签查询的索引', [
+        'CREATE INDEX IF NOT EXISTS idx_links_hidden_sort ON links (is_hidden, sort_order, id)',
+        'CREATE INDEX IF NOT EXISTS idx_links_sort ON links (sort_order, id)',
+        'CREATE INDEX IF NOT EXISTS idx_links_category ON links (category_id)',
+        'CREATE INDEX IF NOT EXISTS idx_categories_sort ON categories (sort_order, id)',
+        'CREATE INDEX IF NOT EXISTS idx_bookmarks_sort ON bookmarks (sort_order, id DESC)',
+    ]),
+    (2, 'Token 表记录访问时间（按命名空间 LRU 淘汰）', [
+        'ALTER TABLE tokens ADD COLUMN accessed REAL NOT NULL DEFAULT 0',
+        'CREATE INDEX IF NOT EXISTS idx_tokens_ns_accessed ON tokens (ns, accessed)',
+    ]),
+]
+
+def migrate_db(conn):
+    """按版本号依次执行未应用的迁移（多 worker 同时启动时由写锁串行化）"""
+    cursor = conn.cursor()
+    applied = False
+    for version, description, statements in MIGRATIONS:
+        cursor.execute('BEGIN IMMEDIATE')
+        current = cursor.execute('PRAGMA user_version').fetchone()[0]
+        if current >= version:
+            conn.commit()
+            continue
+        try:
+            for sql in statements:
+                cursor.execute(sql)
+            cursor.execute(f'PRAGMA user_version = {int(version)}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"数据库迁移 {version}: {description}")
+        applied = True
+    if applied:
+        # 更新统计信息，让查询规划器使用新索引
+        cursor.execute('ANALYZE')
+
+# 全文索引覆盖的列
+SEARCH_INDEXES = {
+    'links': ('title', 'description', 'url'),
+    'bookmarks': ('title', 'url'),
+}
+
+def init_search_index(conn):
+    """创建 FTS5 全文索引（trigram 分词，支持中文子串）及同步触发器
+
+    依赖 SQLite 的编译选项（3.34+ 且启用 FTS5），因此不放在迁移中，而是每次启动检查：
+    不支持时跳过，搜索退回 LIKE；升级 SQLite 后下次启动自动建立索引。
+    """
+    global search_fts_enabled
+    cursor = conn.cursor()
+    try:
+        cursor.execute("CREATE VIRTUAL TABLE temp.fts_probe USING fts5(x, tokenize='trigram')")
+        cursor.execute('DROP TABLE temp.fts_probe')
+    except sqlite3.OperationalError:
+        print("当前 SQLite 不支持 FTS5 trigram 分词，搜索将使用 LIKE")
+        search_fts_enabled = False
+        return
+    
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        for table, columns in SEARCH_INDEXES.items():
+            fts = f'{table}_fts'
+            exists = cursor.execute('SELECT 1 FROM sqlite_master WHERE name = ?', (fts,)).fetchone()
+            cols = ', '.join(columns)
+            new = ', '.join(f'new.{c}' for c in columns)
+            old = ', '.join(f'old.{c}' for c in columns)
+            cursor.execute(f"""CREATE VIRTUAL TABLE IF NOT EXISTS {fts}
+                USING fts5({cols}, content='{table}', content_rowid='id', tokenize='trigram')""")
+            cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+                INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new});
+            END""")
+            cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old});
+            END""")
+            cursor.execute(f"""CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old});
+                INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new});
+            END""")
+            if not exists:
+                # 首次建立索引时导入已有数据
+                cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+                print(f"已建立全文索引: {fts}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    search_fts_enabled = True
+
+search_fts_enabled = False
+
+def audit_query_plans():
+    """检查首页等热点查询的执行计划，退化为全表扫描或临时排序时打印警告"""
+    hot_queries = [
+        (CATEGORIES_SQL, ()),
+        (LINKS_PUBLIC_SQL, ()),
+        (LINKS_HIDDEN_SQL, ()),
+        ('UPDATE links SET category_id = NULL WHERE category_id = ?', (0,)),
+        ('SELECT * FROM bookmarks ORDER BY sort_order, id DESC', ()),
+    ]
+    # 使用独立的新连接：池中连接缓存的预编译语句和表结构可能已过期
+    conn = sqlite3.connect(DATABASE)
+    cursor = conn.cursor()
+    regressions = 0
+    for sql, params in hot_queries:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        details = [row[3] for row in cursor.fetchall()]
+        if any('TEMP B-TREE' in d or re.fullmatch(r'SCAN \w+', d) for d in details):
+            regressions += 1
+            print(f"查询计划退化: {sql} -> {'; '.join(details)}")
+    conn.close()
+    return regressions
+
 def hash_password(password):
     """安全的密码哈希（使用 PBKDF2 + Salt）"""
     # 使用 150,000 次迭代，在安全性和性能之间取得平衡
     return generate_password_hash(password, method='pbkdf2:sha256:150000')
 
+class HashPoolBusy(Exception):
+    """密码校验排队已满"""
+
+class PasswordHashPool:
+    """有界的密码校验进程池"""
+
+    def __init__(self, workers, max_pending):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._total_time = 0.0
+        self._max_time = 0.0
+
+    @staticmethod
+    def _mp_context():
+        """子进程启动方式：本进程已有后台线程（清理、预热、刷新），fork 会复制它们持有的锁，
+        因此使用 forkserver（不支持的平台用 spawn）；forkserver 只预加载密码校验模块，不导入主模块"""
+        methods = multiprocessing.get_all_start_methods()
+        if 'forkserver' not in methods:
+            return multiprocessing.get_context('spawn')
+        ctx = multiprocessing.get_context('forkserver')
+        ctx.set_forkserver_preload(['werkzeug.security'])
+        return ctx
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                try:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=self._mp_context())
+                except (OSError, NotImplementedError):
+                    # 无法创建进程池（如缺少 /dev/shm）时退化为线程池，PBKDF2 计算会释放 GIL
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _reset(self):
+        with self._lock:
+            self._executor = None
+
+    def verify(self, password, password_hash):
+        """在进程池中校验密码，排队已满时抛出 HashPoolBusy"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashPoolBusy()
+        start = time.monotonic()
+        with self._lock:
+            self.pending += 1
+        try:
+            try:
+                future = self._get_executor().submit(check_password_hash, password_hash, password)
+                return future.result()
+            except BrokenProcessPool:
+                # 子进程异常退出，重建进程池
+                self._reset()
+                return self._get_executor().submit(check_password_hash, password_hash, password).result()
+        finally:
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+                self._total_time += elapsed
+                self._max_time = max(self._max_time, elapsed)
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'pending': self.pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'avg_latency_ms': round(self._total_time / self.completed * 1000, 3) if self.completed else 0,
+                'max_latency_ms': round(self._max_time * 1000, 3),
+            }
+
+hash_pool = PasswordHashPool(HASH_POOL_WORKERS, HASH_POOL_MAX_PENDING)
+
 def verify_password(password, password_hash):
-    """验证密码"""
-    return check_password_hash(password_hash, password)
+    """验证密码（在进程池中计算）"""
+    if HASH_POOL_WORKERS <= 0:
+        return check_password_hash(password_hash, password)
+    return hash_pool.verify(password, password_hash)
 
 def is_strong_password(password):
     """检查密码是否为至少8位字母与数字的组合"""
@@ -206,49 +757,359 @@ def is_valid_url(url):
 def generate_csrf_token():
     """生成 CSRF Token"""
     token = secrets.token_hex(32)
-    csrf_tokens[token] = datetime.now() + timedelta(hours=24)
+    token_store.set('csrf', token, True, 24 * 3600)
     return token
 
 def validate_csrf_token(token):
     """验证 CSRF Token"""
-    if not token or token not in csrf_tokens:
-        return False
-    if csrf_tokens[token] < datetime.now():
-        del csrf_tokens[token]
+    if not token:
         return False
-    return True
+    return token_store.get('csrf', token) is not None
 
-def get_config(key):
-    """获取配置"""
+# 配置缓存: {'version': int, 'values': {key: value}}
+_config_cache = {'version': None, 'values': {}}
+_config_lock = threading.Lock()
+
+def get_versions():
+    """获取所有版本计数（同一请求内只查询一次）"""
+    if has_request_context() and '_versions' in g:
+        return g._versions
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute('SELECT name, value FROM versions')
+    versions = {row['name']: row['value'] for row in cursor.fetchall()}
+    conn.close()
+    if has_request_context():
+        g._versions = versions
+    return versions
+
+def get_version(name):
+    """获取指定版本计数"""
+    return get_versions().get(name, 0)
+
+def bump_version(cursor, name):
+    """递增版本计数（在调用方的事务中执行）"""
+    cursor.execute(
+        '''INSERT INTO versions (name, value) VALUES (?, 1)
+           ON CONFLICT(name) DO UPDATE SET value = value + 1''',
+        (name,)
+    )
+    if has_request_context():
+        g.pop('_versions', None)
+
+def load_config():
+    """获取全部配置（版本未变时直接返回缓存）"""
+    version = get_version('config')
+    with _config_lock:
+        if _config_cache['version'] == version:
+            return _config_cache['values']
+    
+    # 在同一个读事务中读取版本和配置，保证两者一致
     conn = get_db()
     cursor = conn.cursor()
-    cursor.execute('SELECT value FROM config WHERE key = ?', (key,))
+    cursor.execute('BEGIN')
+    cursor.execute("SELECT value FROM versions WHERE name = 'config'")
     row = cursor.fetchone()
+    version = row['value'] if row else 0
+    cursor.execute('SELECT key, value FROM config')
+    values = {row['key']: row['value'] for row in cursor.fetchall()}
+    conn.commit()
     conn.close()
-    return row['value'] if row else None
+    
+    with _config_lock:
+        _config_cache['version'] = version
+        _config_cache['values'] = values
+    return values
+
+def get_config(key):
+    """获取配置"""
+    return load_config().get(key)
 
 def set_config(key, value):
     """设置配置"""
     conn = get_db()
     cursor = conn.cursor()
     cursor.execute('INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)', (key, value))
+    bump_version(cursor, 'config')
     conn.commit()
     conn.close()
+    
+    # 写入后立即失效本进程缓存，其他进程通过版本计数感知
+    with _config_lock:
+        _config_cache['version'] = None
+
+# ==================== Token 存储 ====================
+
+class TokenStore:
+    """Token 存储接口：按命名空间保存带过期时间的条目（值需可 JSON 序列化）"""
+
+    def get(self, ns, key):
+        """获取条目，不存在或已过期返回 None"""
+        raise NotImplementedError
+
+    def set(self, ns, key, value, ttl):
+        """写入条目，ttl 为有效秒数"""
+        raise NotImplementedError
+
+    def delete(self, ns, key):
+        """删除条目"""
+        raise NotImplementedError
+
+    def incr(self, ns, key, ttl):
+        """计数器加一并返回新值（首次创建时设置 ttl）"""
+        raise NotImplementedError
+
+    def sweep(self):
+        """清理过期条目"""
+
+    def stats(self):
+        """存储统计"""
+        return {}
+
+class MemoryTokenStore(TokenStore):
+    """进程内存储（仅适用于单 worker），每个命名空间各自限额、超出时按 LRU 淘汰"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries  # 每个命名空间的条目上限
+        self._data = {}  # {ns: OrderedDict(key -> (expires, value))}，按最近访问排序
+        self._heap = []  # [(expires, ns, key)]，供后台清理按过期时间弹出
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expired = 0
+
+    def get(self, ns, key):
+        with self._lock:
+            entries = self._data.get(ns)
+            item = entries.get(key) if entries else None
+            if item is None:
+                return None
+            if item[0] < time.time():
+                del entries[key]
+                self.expired += 1
+                return None
+            entries.move_to_end(key)
+            return item[1]
+
+    def _put(self, ns, key, expires, value):
+        """写入条目（调用方持有锁）"""
+        entries = self._data.setdefault(ns, OrderedDict())
+        old = entries.get(key)
+        entries[key] = (expires, value)
+        entries.move_to_end(key)
+        if old is None or old[0] != expires:
+            heapq.heappush(self._heap, (expires, ns, key))
+        # 只在本命名空间内淘汰，登录失败计数再多也挤不掉会话 token
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self.evictions += 1
+        # 被覆盖或淘汰的条目会在堆中留下失效记录，过多时重建
+        if len(self._heap) > 2 * self.max_entries * len(self._data):
+            self._heap = [(exp, n, k) for n, items in self._data.items() for k, (exp, _) in items.items()]
+            heapq.heapify(self._heap)
+
+    def set(self, ns, key, value, ttl):
+        with self._lock:
+            self._put(ns, key, time.time() + ttl, value)
+
+    def delete(self, ns, key):
+        with self._lock:
+            entries = self._data.get(ns)
+            if entries:
+                entries.pop(key, None)
+
+    def incr(self, ns, key, ttl):
+        with self._lock:
+            now = time.time()
+            entries = self._data.get(ns)
+            item = entries.get(key) if entries else None
+            if item is None or item[0] < now:
+                item = (now + ttl, 0)
+            self._put(ns, key, item[0], item[1] + 1)
+            return item[1] + 1
+
+    def sweep(self):
+        now = time.time()
+        with self._lock:
+            while self._heap and self._heap[0][0] < now:
+                expires, ns, key = heapq.heappop(self._heap)
+                entries = self._data.get(ns)
+                item = entries.get(key) if entries else None
+                # 只删除过期时间与堆记录一致的条目（已续期的条目不受影响）
+                if item is not None and item[0] == expires:
+                    del entries[key]
+                    self.expired += 1
+
+    def stats(self):
+        with self._lock:
+            sizes = {ns: len(entries) for ns, entries in self._data.items() if entries}
+            return {
+                'backend': 'memory',
+                'size': sum(sizes.values()),
+                'max_entries': self.max_entries,
+                'sizes': sizes,
+                'heap_size': len(self._heap),
+                'evictions': self.evictions,
+                'expired': self.expired,
+            }
+
+class SQLiteTokenStore(TokenStore):
+    """存放在主数据库 tokens 表中，多 worker 共享；每个命名空间各自限额，写入时按 LRU 淘汰"""
+
+    TOUCH_INTERVAL = 60  # 访问时间的更新粒度（秒），避免每次读取都写库
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries  # 每个命名空间的条目上限
+        self.evictions = 0
+        self.expired = 0
+
+    def _trim(self, cursor, ns):
+        """命名空间超出上限时淘汰最久未访问的条目（调用方提交事务）"""
+        cursor.execute(
+            '''DELETE FROM tokens WHERE rowid IN (
+                   SELECT rowid FROM tokens WHERE ns = ? ORDER BY accessed, rowid
+                   LIMIT max(0, (SELECT COUNT(*) FROM tokens WHERE ns = ?) - ?)
+               )''',
+            (ns, ns, self.max_entries)
+        )
+        self.evictions += cursor.rowcount
+
+    def get(self, ns, key):
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute('SELECT value, expires, accessed FROM tokens WHERE ns = ? AND key = ?', (ns, key))
+        row = cursor.fetchone()
+        now = time.time()
+        if row and row['expires'] < now:
+            cursor.execute('DELETE FROM tokens WHERE ns = ? AND key = ?', (ns, key))
+            conn.commit()
+            row = None
+        elif row and row['accessed'] < now - self.TOUCH_INTERVAL:
+            cursor.execute('UPDATE tokens SET accessed = ? WHERE ns = ? AND key = ?', (now, ns, key))
+            conn.commit()
+        conn.close()
+        return json.loads(row['value']) if row else None
+
+    def set(self, ns, key, value, ttl):
+        conn = get_db()
+        cursor = conn.cursor()
+        now = time.time()
+        cursor.execute(
+            'INSERT OR REPLACE INTO tokens (ns, key, value, expires, accessed) VALUES (?, ?, ?, ?, ?)',
+            (ns, key, json.dumps(value), now + ttl, now)
+        )
+        self._trim(cursor, ns)
+        conn.commit()
+        conn.close()
+
+    def delete(self, ns, key):
+        conn = get_db()
+        conn.execute('DELETE FROM tokens WHERE ns = ? AND key = ?', (ns, key))
+        conn.commit()
+        conn.close()
+
+    def incr(self, ns, key, ttl):
+        now = time.time()
+        conn = get_db()
+        cursor = conn.cursor()
+        # 单条 UPSERT 保证多 worker 并发计数不丢失
+        cursor.execute(
+            '''INSERT INTO tokens (ns, key, value, expires, accessed) VALUES (?, ?, '1', ?, ?)
+               ON CONFLICT(ns, key) DO UPDATE SET
+                   value = CASE WHEN expires < ? THEN '1' ELSE CAST(value AS INTEGER) + 1 END,
+                   expires = CASE WHEN expires < ? THEN excluded.expires ELSE expires END,
+                   accessed = excluded.accessed''',
+            (ns, key, now + ttl, now, now, now)
+        )
+        cursor.execute('SELECT value FROM tokens WHERE ns = ? AND key = ?', (ns, key))
+        count = int(cursor.fetchone()['value'])
+        self._trim(cursor, ns)
+        conn.commit()
+        conn.close()
+        return count
+
+    def sweep(self):
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM tokens WHERE expires < ?', (time.time(),))
+        self.expired += cursor.rowcount
+        conn.commit()
+        conn.close()
+
+    def stats(self):
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute('SELECT ns, COUNT(*) AS n FROM tokens GROUP BY ns')
+        sizes = {row['ns']: row['n'] for row in cursor.fetchall()}
+        conn.close()
+        return {
+            'backend': 'sqlite',
+            'size': sum(sizes.values()),
+            'max_entries': self.max_entries,
+            'sizes': sizes,
+            'evictions': self.evictions,
+            'expired': self.expired,
+        }
+
+class RedisTokenStore(TokenStore):
+    """Redis 存储（需要安装 redis 包，也可传入兼容的客户端对象）"""
+
+    def __init__(self, client=None, prefix='oasis'):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError('TOKEN_STORE=redis 需要安装 redis 包: pip install redis')
+            client = redis.Redis.from_url(REDIS_URL)
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, ns, key):
+        return f'{self.prefix}:{ns}:{key}'
+
+    def get(self, ns, key):
+        value = self.client.get(self._key(ns, key))
+        return json.loads(value) if value is not None else None
+
+    def set(self, ns, key, value, ttl):
+        self.client.set(self._key(ns, key), json.dumps(value), ex=max(1, int(ttl)))
+
+    def delete(self, ns, key):
+        self.client.delete(self._key(ns, key))
+
+    def incr(self, ns, key, ttl):
+        name = self._key(ns, key)
+        count = self.client.incr(name)
+        if count == 1:
+            self.client.expire(name, max(1, int(ttl)))
+        return count
+
+    def stats(self):
+        # 过期由 Redis 自行处理
+        return {'backend': 'redis'}
+
+def create_token_store(backend):
+    """根据配置创建 Token 存储"""
+    if backend == 'sqlite':
+        return SQLiteTokenStore(TOKEN_STORE_MAX_ENTRIES)
+    if backend == 'redis':
+        return RedisTokenStore()
+    if backend != 'memory':
+        raise ValueError(f'未知的 TOKEN_STORE: {backend}')
+    return MemoryTokenStore(TOKEN_STORE_MAX_ENTRIES)
+
+token_store = create_token_store(TOKEN_STORE)
+register_background_task('token-sweeper', TOKEN_SWEEP_INTERVAL, token_store.sweep)
 
 def require_auth(f):
     """需要认证的装饰器"""
     @wraps(f)
     def decorated(*args, **kwargs):
         token = request.headers.get('Authorization', '').replace('Bearer ', '')
-        if not token or token not in active_tokens:
+        # 过期的 token 由存储层视为不存在
+        token_info = token_store.get('token', token) if token else None
+        if token_info is None:
             return jsonify({'error': '未授权'}), 401
         
-        token_info = active_tokens[token]
-        # 检查 token 是否过期
-        if token_info['expires'] < datetime.now():
-            del active_tokens[token]
-            return jsonify({'error': 'Token 已过期'}), 401
-        
         # 检查 IP 绑定（如果开启，且 token 有记录 IP）
         ip_binding_enabled = get_config('ip_binding_enabled') == '1'
         if ip_binding_enabled and token_info.get('ip'):  # 只有当 ip 值存在且不为 None 时才检查
@@ -261,10 +1122,46 @@ def require_auth(f):
 
 # ==================== 页面路由 ====================
 
+# 渲染好的首页: {'page': {'etag': str, 'body': bytes, 'gzip': bytes}}
+_index_page_cache = {'page': None}
+_index_template_hash = None
+
+def get_index_page_etag():
+    """首页 ETag：公开首屏数据的 ETag 加上模板摘要（模板更新后旧页面失效）"""
+    global _index_template_hash
+    if _index_template_hash is None:
+        source = app.jinja_env.loader.get_source(app.jinja_env, 'index.html')[0]
+        _index_template_hash = hashlib.md5(source.encode()).hexdigest()[:8]
+    return f"index-{_index_template_hash}-{get_content_etag('bootstrap-public')}"
+
+def render_index_page(etag):
+    """渲染内嵌公开首屏数据的首页（隐藏链接仍需输入密码后通过接口获取）"""
+    started = time.perf_counter()
+    entry = content_cache.get('bootstrap-public', get_versions())
+    data = json.loads(entry['body'])
+    # 转义 <、>、&，避免链接标题中的 </script> 提前结束脚本块
+    inline = entry['body'].decode().replace('<', '\\u003c').replace('>', '\\u003e').replace('&', '\\u0026')
+    body = render_template('index.html', settings=data['settings'], bootstrap_json=Markup(inline)).encode()
+    page = {'etag': etag, 'body': body, 'gzip': compress_payload(body)}
+    print(f"首页重新渲染: {etag}, {len(body)} 字节, 耗时 {(time.perf_counter() - started) * 1000:.1f}ms")
+    return page
+
 @app.route('/')
 def index():
     """首页"""
-    return render_template('index.html')
+    if not INDEX_INLINE_DATA:
+        return render_template('index.html', settings={})
+    
+    etag = get_index_page_etag()
+    response = content_not_modified(etag)
+    if response:
+        return response
+    page = _index_page_cache['page']
+    if page is None or page['etag'] != etag:
+        page = render_index_page(etag)
+        _index_page_cache['page'] = page
+    response = encoded_response(page['body'], page['gzip'], 'text/html')
+    return content_response(response, page['etag'])
 
 @app.route('/admin')
 def admin():
@@ -292,6 +1189,11 @@ def page_not_found(e):
     """全局 404 处理"""
     return render_template('404.html'), 404
 
+@app.errorhandler(HashPoolBusy)
+def hash_pool_busy(e):
+    """密码校验排队已满，快速拒绝"""
+    return jsonify({'error': '验证请求过多，请稍后重试'}), 429, {'Retry-After': '1'}
+
 # ==================== API 路由 ====================
 
 def check_csrf():
@@ -392,37 +1294,26 @@ def api_verify_token():
 
 def check_login_limit(ip):
     """检查是否超过登录限制"""
-    if ip not in login_attempts:
+    locked_until = token_store.get('lockout', ip)
+    if locked_until is None:
         return True, None
     
-    attempt = login_attempts[ip]
-    
-    # 检查是否在锁定期
-    if 'locked_until' in attempt and attempt['locked_until'] > datetime.now():
-        remaining = (attempt['locked_until'] - datetime.now()).seconds // 60 + 1
-        return False, f'登录失败次数过多，请 {remaining} 分钟后重试'
-    
-    # 锁定期已过，重置计数
-    if 'locked_until' in attempt and attempt['locked_until'] <= datetime.now():
-        login_attempts[ip] = {'count': 0}
-    
-    return True, None
+    remaining = int(max(0, locked_until - time.time())) // 60 + 1
+    return False, f'登录失败次数过多，请 {remaining} 分钟后重试'
 
 def record_login_failure(ip):
     """记录登录失败"""
-    if ip not in login_attempts:
-        login_attempts[ip] = {'count': 0}
-    
-    login_attempts[ip]['count'] += 1
+    # 失败计数在锁定时长内有效，过期后自动清零
+    count = token_store.incr('login_fail', ip, LOCKOUT_DURATION * 60)
     
     # 超过最大次数，锁定账户
-    if login_attempts[ip]['count'] >= MAX_LOGIN_ATTEMPTS:
-        login_attempts[ip]['locked_until'] = datetime.now() + timedelta(minutes=LOCKOUT_DURATION)
+    if count >= MAX_LOGIN_ATTEMPTS:
+        token_store.set('lockout', ip, time.time() + LOCKOUT_DURATION * 60, LOCKOUT_DURATION * 60)
+        token_store.delete('login_fail', ip)
 
 def clear_login_attempts(ip):
     """清除登录失败记录"""
-    if ip in login_attempts:
-        del login_attempts[ip]
+    token_store.delete('login_fail', ip)
 
 @app.route('/api/login', methods=['POST'])
 def api_login():
@@ -458,14 +1349,12 @@ def api_login():
     
     # 生成 token，有效期 30 分钟
     token = secrets.token_hex(32)
-    expires = datetime.now() + timedelta(minutes=30)
     
     # 如果开启 IP 绑定，记录 IP
     ip_binding_enabled = get_config('ip_binding_enabled') == '1'
-    active_tokens[token] = {
-        'expires': expires,
+    token_store.set('token', token, {
         'ip': client_ip if ip_binding_enabled else None
-    }
+    }, 1800)
     
     return jsonify({'token': token, 'expires_in': 1800})
 
@@ -491,14 +1380,12 @@ def api_verify_hidden():
         clear_login_attempts(client_ip)
         # 生成临时 token，有效期 2 分钟（仅用于当前页面会话，刷新后前端会清除）
         token = secrets.token_hex(16)
-        expires = datetime.now() + timedelta(minutes=2)
         
         # 如果开启 IP 绑定，记录 IP
         ip_binding_enabled = get_config('ip_binding_enabled') == '1'
-        active_tokens[f'hidden_{token}'] = {
-            'expires': expires,
+        token_store.set('hidden', token, {
             'ip': client_ip if ip_binding_enabled else None
-        }
+        }, 120)
         return jsonify({'token': token, 'expires_in': 120})
     
     record_login_failure(client_ip)
@@ -506,64 +1393,1035 @@ def api_verify_hidden():
 
 # ==================== 图标代理 ====================
 
+class IconMemoryCache:
+    """按字节数限制的内存 LRU 缓存，位于磁盘缓存之前"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        # 单个条目最多占预算的 1/8，避免一个大图标挤掉大量小图标
+        self.max_entry_bytes = max_bytes // 8
+        self._data = OrderedDict()  # {icon_url: (content, content_type, expires, validators)}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.evictions = 0
+
+    def get(self, icon_url):
+        """获取条目（不检查过期，由调用方判断是否需要刷新）"""
+        with self._lock:
+            item = self._data.get(icon_url)
+            if item is None:
+                return None
+            self._data.move_to_end(icon_url)
+            return item
+
+    def put(self, icon_url, content, content_type, expires, validators):
+        if len(content) > self.max_entry_bytes:
+            return
+        with self._lock:
+            self._remove(icon_url)
+            self._data[icon_url] = (content, content_type, expires, validators)
+            self.bytes += len(content)
+            while self.bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def discard(self, icon_url):
+        with self._lock:
+            self._remove(icon_url)
+
+    def urls(self):
+        with self._lock:
+            return list(self._data)
+
+    def _remove(self, icon_url):
+        """删除条目（调用方持有锁）"""
+        item = self._data.pop(icon_url, None)
+        if item is not None:
+            self.bytes -= len(item[0])
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._data),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+            }
+
+icon_memory_cache = IconMemoryCache(ICON_MEMORY_CACHE_BYTES)
+
+# 各级缓存命中统计
+icon_cache_stats = {
+    'memory_hits': 0, 'memory_misses': 0, 'disk_hits': 0, 'disk_misses': 0,
+    'stale_served': 0, 'negative_hits': 0, 'refreshes': 0, 'refresh_failures': 0,
+    'refresh_dropped': 0, 'revalidated': 0, 'not_modified': 0, 'batch_unchanged': 0,
+}
+icon_cache_stats_lock = threading.Lock()
+
+def count_icon_cache(name):
+    """累加缓存命中计数"""
+    with icon_cache_stats_lock:
+        icon_cache_stats[name] += 1
+
+def get_icon_cache_key(icon_url):
+    """图标缓存键（URL 的 MD5 哈希）"""
+    return hashlib.md5(icon_url.encode()).hexdigest()
+
 def get_icon_cache_path(icon_url):
     """根据 URL 生成缓存文件路径"""
     # 使用 MD5 哈希作为文件名
-    cache_key = hashlib.md5(icon_url.encode()).hexdigest()
-    return os.path.join(ICON_CACHE_DIR, f"{cache_key}.ico")
+    return os.path.join(ICON_CACHE_DIR, f"{get_icon_cache_key(icon_url)}.ico")
 
 def get_icon_meta_path(icon_url):
     """获取图标元信息文件路径"""
-    cache_key = hashlib.md5(icon_url.encode()).hexdigest()
-    return os.path.join(ICON_CACHE_DIR, f"{cache_key}.meta")
+    return os.path.join(ICON_CACHE_DIR, f"{get_icon_cache_key(icon_url)}.meta")
 
-def is_cache_valid(cache_path):
-    """检查缓存是否有效（未过期）"""
-    if not os.path.exists(cache_path):
-        return False
-    
-    # 检查文件修改时间
-    file_mtime = datetime.fromtimestamp(os.path.getmtime(cache_path))
-    expire_time = file_mtime + timedelta(days=ICON_CACHE_EXPIRE_DAYS)
-    return datetime.now() < expire_time
+def write_file_atomic(path, data):
+    """原子写入文件（临时文件 + rename），读取方不会看到写了一半的文件"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def parse_icon_meta(text):
+    """解析 .meta 文件：JSON 格式，兼容旧版只保存 Content-Type 的纯文本"""
+    text = text.strip()
+    meta = {'content_type': 'image/x-icon', 'etag': None, 'last_modified': None, 'digest': None}
+    if text.startswith('{'):
+        try:
+            meta.update(json.loads(text))
+        except ValueError:
+            pass
+    elif text:
+        meta['content_type'] = text
+    return meta
+
+def get_icon_digest(content):
+    """图标内容摘要，作为返回给浏览器的 ETag"""
+    return hashlib.md5(content).hexdigest()
+
+class FileIconStore:
+    """文件缓存：每个图标一个 .ico 文件和一个 .meta 文件"""
+
+    name = 'files'
+
+    def load(self, icon_url):
+        """读取缓存条目，不存在返回 None（不检查过期）"""
+        try:
+            with open(get_icon_cache_path(icon_url), 'rb') as f:
+                content = f.read()
+                st = os.fstat(f.fileno())
+                fetched_at = st.st_mtime
+                # 用 atime 记录最近访问时间（供 LRU 回收），mtime 保持为获取时间
+                now = time.time()
+                if now - st.st_atime > ICON_ACCESS_RESOLUTION:
+                    os.utime(f.fileno(), (now, st.st_mtime))
+        except FileNotFoundError:
+            return None
+        
+        try:
+            with open(get_icon_meta_path(icon_url), 'r') as f:
+                meta = parse_icon_meta(f.read())
+        except FileNotFoundError:
+            meta = parse_icon_meta('')
+        
+        return dict(meta, content=content, fetched_at=fetched_at, digest=meta['digest'] or get_icon_digest(content))
+
+    def save(self, icon_url, content, content_type, etag=None, last_modified=None):
+        """写入缓存条目"""
+        # 确保缓存目录存在
+        if not os.path.exists(ICON_CACHE_DIR):
+            os.makedirs(ICON_CACHE_DIR, mode=0o755, exist_ok=True)
+        
+        meta = {
+            'content_type': content_type,
+            'etag': etag,
+            'last_modified': last_modified,
+            'digest': get_icon_digest(content),
+        }
+        # 先写元信息，再写图标文件（有效期以图标文件为准）
+        write_file_atomic(get_icon_meta_path(icon_url), json.dumps(meta).encode())
+        write_file_atomic(get_icon_cache_path(icon_url), content)
 
-def save_icon_to_cache(icon_url, content, content_type):
+    def touch(self, icon_url):
+        """上游确认未修改，刷新获取时间"""
+        try:
+            os.utime(get_icon_cache_path(icon_url))
+        except FileNotFoundError:
+            pass
+
+    def entries(self):
+        """列出所有缓存条目的键、大小和时间信息"""
+        if not os.path.isdir(ICON_CACHE_DIR):
+            return []
+        result = []
+        now = time.time()
+        for entry in os.scandir(ICON_CACHE_DIR):
+            if entry.name.startswith('.tmp-'):
+                # 异常退出遗留的临时文件
+                try:
+                    if now - entry.stat().st_mtime > 3600:
+                        os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass
+                continue
+            if not entry.name.endswith('.ico'):
+                continue
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            key = entry.name[:-len('.ico')]
+            size = st.st_size
+            try:
+                size += os.stat(os.path.join(ICON_CACHE_DIR, f"{key}.meta")).st_size
+            except FileNotFoundError:
+                pass
+            result.append({
+                'key': key,
+                'size': size,
+                'fetched_at': st.st_mtime,
+                'last_access': max(st.st_atime, st.st_mtime),
+            })
+        return result
+
+    def delete(self, keys):
+        """删除缓存条目"""
+        for key in keys:
+            for ext in ('ico', 'meta'):
+                try:
+                    os.unlink(os.path.join(ICON_CACHE_DIR, f"{key}.{ext}"))
+                except FileNotFoundError:
+                    pass
+
+class SQLiteIconStore:
+    """单文件缓存：所有图标以 BLOB 形式存放在一个 SQLite 数据库中"""
+
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_db(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ConnectionPool(self.path, max_size=db_pool.max_size, pragmas=db_pool.pragmas)
+                conn = self._pool.checkout()
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS icons (
+                        key TEXT PRIMARY KEY,
+                        url TEXT,
+                        content BLOB NOT NULL,
+                        content_type TEXT NOT NULL,
+                        fetched_at REAL NOT NULL,
+                        last_access REAL NOT NULL DEFAULT 0,
+                        etag TEXT,
+                        last_modified TEXT,
+                        digest TEXT
+                    )
+                ''')
+                # 补齐旧版本数据库缺少的列
+                columns = [row['name'] for row in conn.execute('PRAGMA table_info(icons)')]
+                for column, definition in [
+                    ('last_access', 'REAL NOT NULL DEFAULT 0'),
+                    ('etag', 'TEXT'),
+                    ('last_modified', 'TEXT'),
+                    ('digest', 'TEXT'),
+                ]:
+                    if column not in columns:
+                        conn.execute(f'ALTER TABLE icons ADD COLUMN {column} {definition}')
+                conn.commit()
+                conn.close()
+        return self._pool.checkout()
+
+    def load(self, icon_url):
+        key = get_icon_cache_key(icon_url)
+        conn = self._get_db()
+        cursor = conn.cursor()
+        cursor.execute(
+            '''SELECT content, content_type, fetched_at, last_access, etag, last_modified, digest
+               FROM icons WHERE key = ?''',
+            (key,)
+        )
+        row = cursor.fetchone()
+        if row is not None:
+            # 记录最近访问时间（供 LRU 回收），按精度降低写入频率
+            now = time.time()
+            if now - row['last_access'] > ICON_ACCESS_RESOLUTION:
+                cursor.execute('UPDATE icons SET last_access = ? WHERE key = ?', (now, key))
+                conn.commit()
+        conn.close()
+        if row is None:
+            return None
+        return {
+            'content': row['content'],
+            'content_type': row['content_type'],
+            'fetched_at': row['fetched_at'],
+            'etag': row['etag'],
+            'last_modified': row['last_modified'],
+            'digest': row['digest'] or get_icon_digest(row['content']),
+        }
+
+    def save(self, icon_url, content, content_type, etag=None, last_modified=None):
+        conn = self._get_db()
+        conn.execute(
+            '''INSERT OR REPLACE INTO icons
+               (key, url, content, content_type, fetched_at, last_access, etag, last_modified, digest)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (get_icon_cache_key(icon_url), icon_url, content, content_type, time.time(), time.time(),
+             etag, last_modified, get_icon_digest(content))
+        )
+        conn.commit()
+        conn.close()
+
+    def touch(self, icon_url):
+        conn = self._get_db()
+        conn.execute('UPDATE icons SET fetched_at = ? WHERE key = ?', (time.time(), get_icon_cache_key(icon_url)))
+        conn.commit()
+        conn.close()
+
+    def entries(self):
+        conn = self._get_db()
+        cursor = conn.cursor()
+        cursor.execute('SELECT key, length(content) AS size, fetched_at, last_access FROM icons')
+        result = [{
+            'key': row['key'],
+            'size': row['size'],
+            'fetched_at': row['fetched_at'],
+            'last_access': max(row['last_access'], row['fetched_at']),
+        } for row in cursor.fetchall()]
+        conn.close()
+        return result
+
+    def delete(self, keys):
+        conn = self._get_db()
+        conn.executemany('DELETE FROM icons WHERE key = ?', [(key,) for key in keys])
+        conn.commit()
+        conn.close()
+
+    def migrate_from_files(self, cache_dir):
+        """把旧布局的 .ico/.meta 文件导入数据库，成功后删除原文件"""
+        if not os.path.isdir(cache_dir):
+            return 0
+        
+        migrated_paths = []
+        conn = self._get_db()
+        for name in os.listdir(cache_dir):
+            if not name.endswith('.ico'):
+                continue
+            key = name[:-len('.ico')]
+            ico_path = os.path.join(cache_dir, name)
+            meta_path = os.path.join(cache_dir, f"{key}.meta")
+            try:
+                with open(ico_path, 'rb') as f:
+                    content = f.read()
+                    fetched_at = os.fstat(f.fileno()).st_mtime
+            except FileNotFoundError:
+                continue  # 可能被其他 worker 迁移
+            try:
+                with open(meta_path, 'r') as f:
+                    meta = parse_icon_meta(f.read())
+            except FileNotFoundError:
+                meta = parse_icon_meta('')
+            # 旧布局只保存了 URL 哈希，url 列留空
+            conn.execute(
+                '''INSERT OR IGNORE INTO icons
+                   (key, url, content, content_type, fetched_at, last_access, etag, last_modified, digest)
+                   VALUES (?, NULL, ?, ?, ?, ?, ?, ?, ?)''',
+                (key, content, meta['content_type'], fetched_at, fetched_at,
+                 meta['etag'], meta['last_modified'], get_icon_digest(content))
+            )
+            migrated_paths.extend([ico_path, meta_path])
+            if len(migrated_paths) % 1000 == 0:
+                conn.commit()
+        conn.commit()
+        conn.close()
+        
+        # 数据已提交，再删除旧文件
+        for path in migrated_paths:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        return len(migrated_paths) // 2
+
+def create_icon_store(backend):
+    """根据配置创建图标磁盘缓存"""
+    if backend == 'sqlite':
+        return SQLiteIconStore(os.path.join(ICON_CACHE_DIR, 'icons.db'))
+    if backend != 'files':
+        raise ValueError(f'未知的 ICON_CACHE_BACKEND: {backend}')
+    return FileIconStore()
+
+icon_store = create_icon_store(ICON_CACHE_BACKEND)
+
+def get_link_domain(url):
+    """提取链接域名（与前端 getDomain 保持一致）"""
+    url = (url or '').strip()
+    if not re.match(r'^https?://', url, re.IGNORECASE):
+        url = 'https://' + url
+    try:
+        hostname = urlparse(url).hostname
+        if hostname:
+            # 浏览器 URL.hostname 会把国际化域名转换为 punycode
+            try:
+                return hostname.encode('idna').decode('ascii')
+            except UnicodeError:
+                return hostname
+    except ValueError:
+        pass
+    return re.sub(r'^(https?://)?', '', url, flags=re.IGNORECASE).split('/')[0]
+
+def get_link_icon_url(url, icon):
+    """链接对应的图标地址（与前端 renderCard 规则一致）"""
+    return icon or f"https://icons.duckduckgo.com/ip3/{get_link_domain(url)}.ico"
+
+# 最近一次缓存回收的统计
+icon_gc_stats = {'runs': 0, 'last_run': None}
+
+def collect_icon_cache():
+    """回收图标缓存：删除超过最长保留时间和不属于任何链接的条目，超出容量按 LRU 淘汰"""
+    start = time.monotonic()
+    now = time.time()
+    
+    # 当前所有链接引用的图标
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute('SELECT url, icon FROM links')
+    referenced = {get_link_icon_url(row['url'], row['icon']) for row in cursor.fetchall()}
+    conn.close()
+    referenced_keys = {get_icon_cache_key(url) for url in referenced}
+    # 内存中的条目正在被使用，视为刚访问过
+    hot_keys = {get_icon_cache_key(url) for url in icon_memory_cache.urls()}
+    
+    removed = {'expired': 0, 'orphaned': 0, 'evicted': 0}
+    to_delete = []
+    kept = []
+    for entry in icon_store.entries():
+        if entry['fetched_at'] + ICON_CACHE_MAX_STALE_DAYS * 86400 < now:
+            removed['expired'] += 1
+        elif (entry['key'] not in referenced_keys and entry['key'] not in hot_keys
+              and entry['fetched_at'] + ICON_ORPHAN_GRACE < now):
+            removed['orphaned'] += 1
+        else:
+            kept.append(entry)
+            continue
+        to_delete.append(entry)
+    
+    # 超出容量时淘汰最久未访问的条目（优先淘汰不属于任何链接的）
+    total = sum(entry['size'] for entry in kept)
+    if total > ICON_CACHE_MAX_BYTES:
+        kept.sort(key=lambda e: (e['key'] in hot_keys, e['key'] in referenced_keys, e['last_access']))
+        for entry in kept:
+            if total <= ICON_CACHE_MAX_BYTES:
+                break
+            to_delete.append(entry)
+            total -= entry['size']
+            removed['evicted'] += 1
+    
+    if to_delete:
+        icon_store.delete([entry['key'] for entry in to_delete])
+    
+    reclaimed = sum(entry['size'] for entry in to_delete)
+    duration_ms = round((time.monotonic() - start) * 1000, 3)
+    icon_gc_stats['runs'] += 1
+    icon_gc_stats['last_run'] = {
+        'at': now,
+        'duration_ms': duration_ms,
+        'reclaimed_bytes': reclaimed,
+        'remaining_bytes': total,
+        'removed': removed,
+    }
+    if to_delete:
+        print(f"图标缓存回收: 删除 {len(to_delete)} 个条目，释放 {reclaimed} 字节，耗时 {duration_ms} ms")
+
+register_background_task('icon-cache-gc', ICON_CACHE_GC_INTERVAL, collect_icon_cache)
+
+def save_icon_to_cache(icon_url, content, content_type, etag=None, last_modified=None):
     """保存图标到缓存"""
-    # 确保缓存目录存在
-    if not os.path.exists(ICON_CACHE_DIR):
-        os.makedirs(ICON_CACHE_DIR, mode=0o755, exist_ok=True)
-    
-    cache_path = get_icon_cache_path(icon_url)
-    meta_path = get_icon_meta_path(icon_url)
+    icon_store.save(icon_url, content, content_type, etag, last_modified)
+    validators = {'etag': etag, 'last_modified': last_modified, 'digest': get_icon_digest(content)}
+    icon_memory_cache.put(icon_url, content, content_type, time.time() + ICON_CACHE_EXPIRE_DAYS * 86400, validators)
+
+def touch_icon_cache(icon_url, cached):
+    """上游返回 304：内容不变，只刷新缓存有效期"""
+    icon_store.touch(icon_url)
+    validators = {key: cached[key] for key in ('etag', 'last_modified', 'digest')}
+    icon_memory_cache.put(
+        icon_url, cached['content'], cached['content_type'],
+        time.time() + ICON_CACHE_EXPIRE_DAYS * 86400, validators
+    )
+
+def load_icon_from_cache(icon_url, record_stats=True):
+    """从缓存加载图标（先查内存，未命中再查磁盘）
     
-    # 保存图标文件
-    with open(cache_path, 'wb') as f:
-        f.write(content)
+    返回 {'content', 'content_type', 'stale', 'etag', 'last_modified', 'digest'}，未命中返回 None。
+    已过期但未超过最长保留时间的条目仍会返回，并标记 stale。
+    """
+    count = count_icon_cache if record_stats else (lambda name: None)
+    now = time.time()
+    max_stale = (ICON_CACHE_MAX_STALE_DAYS - ICON_CACHE_EXPIRE_DAYS) * 86400
     
-    # 保存元信息（Content-Type）
-    with open(meta_path, 'w') as f:
-        f.write(content_type)
+    item = icon_memory_cache.get(icon_url)
+    if item is not None and item[2] + max_stale >= now:
+        count('memory_hits')
+        content, content_type, expires, validators = item
+    else:
+        if item is not None:
+            icon_memory_cache.discard(icon_url)
+        count('memory_misses')
+        
+        try:
+            entry = icon_store.load(icon_url)
+        except Exception as e:
+            print(f"读取图标缓存失败: {e}")
+            entry = None
+        
+        expires = entry['fetched_at'] + ICON_CACHE_EXPIRE_DAYS * 86400 if entry else 0
+        if entry is None or expires + max_stale < now:
+            count('disk_misses')
+            return None
+        
+        count('disk_hits')
+        content, content_type = entry['content'], entry['content_type']
+        validators = {key: entry[key] for key in ('etag', 'last_modified', 'digest')}
+        icon_memory_cache.put(icon_url, content, content_type, expires, validators)
+    
+    return dict(validators, content=content, content_type=content_type, stale=expires < now)
+
+class SingleFlight:
+    """合并同一 key 的并发调用：只执行一次，结果共享给所有等待者"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # {key: {'event': Event, 'result': ..., 'error': ...}}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {'event': threading.Event(), 'result': None, 'error': None}
+                self._calls[key] = call
+                self.executed += 1
+            else:
+                self.coalesced += 1
+        
+        if leader:
+            try:
+                call['result'] = func()
+            except Exception as e:
+                call['error'] = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call['event'].set()
+        else:
+            call['event'].wait()
+        
+        if call['error'] is not None:
+            raise call['error']
+        return call['result']
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+            }
+
+# 图标上游请求合并
+icon_flight = SingleFlight()
+
+class UpstreamClient:
+    """共享的上游 HTTP 客户端：按主机复用 keep-alive 连接"""
+
+    def __init__(self, pool_hosts, pool_size, connect_timeout, read_timeout):
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+            'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
+        })
+        # 不保存任何 Cookie，避免不同请求之间共享状态
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self.adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size)
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def get(self, url, **kwargs):
+        """发起 GET 请求（调用方需关闭响应以归还连接）"""
+        with self._lock:
+            self.requests += 1
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def stats(self):
+        # 汇总仍在连接池管理器中的各主机连接数（被淘汰的主机不计入）
+        pools = self.adapter.poolmanager.pools
+        hosts = {}
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            hosts[f'{pool.scheme}://{pool.host}:{pool.port}'] = {
+                'connections': pool.num_connections,
+                'requests': pool.num_requests,
+            }
+        connections = sum(h['connections'] for h in hosts.values())
+        pool_requests = sum(h['requests'] for h in hosts.values())
+        return {
+            'requests': self.requests,
+            'connections_opened': connections,
+            'connection_reuse_ratio': round(1 - connections / pool_requests, 3) if pool_requests else 0,
+            'hosts': hosts,
+        }
 
-def load_icon_from_cache(icon_url):
-    """从缓存加载图标"""
-    cache_path = get_icon_cache_path(icon_url)
-    meta_path = get_icon_meta_path(icon_url)
+upstream = UpstreamClient(ICON_HTTP_POOL_HOSTS, ICON_HTTP_POOL_SIZE, ICON_CONNECT_TIMEOUT, ICON_READ_TIMEOUT)
+
+class IconTooLarge(Exception):
+    """图标超过大小限制"""
+
+icon_normalize_stats = {
+    'normalized': 0, 'unchanged': 0, 'failed': 0, 'oversized': 0,
+    'bytes_in': 0, 'bytes_out': 0
+}
+icon_normalize_stats_lock = threading.Lock()
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+def pick_ico_frame(content, size):
+    """从多尺寸 ICO 中挑出最合适的一帧：不小于目标尺寸的最小帧，否则取最大帧"""
+    if len(content) < 6:
+        return None
+    reserved, kind, count = struct.unpack_from('<HHH', content, 0)
+    if reserved != 0 or kind != 1 or count == 0 or len(content) < 6 + count * 16:
+        return None
+    
+    frames = []
+    for i in range(count):
+        width, height, _, _, _, bpp, length, offset = struct.unpack_from('<BBBBHHII', content, 6 + i * 16)
+        width = width or 256  # 0 表示 256
+        if length and offset + length <= len(content):
+            frames.append((width, bpp, offset, length))
+    if not frames:
+        return None
+    
+    def rank(frame):
+        width, bpp = frame[0], frame[1]
+        if width >= size:
+            return (0, width, -bpp)
+        return (1, -width, -bpp)
+    width, bpp, offset, length = min(frames, key=rank)
+    return content[offset:offset + length], width, bpp
+
+def normalize_ico(content, size):
+    """纯 Python 处理：只保留一帧，PNG 帧直接返回 PNG，否则重建单帧 ICO"""
+    frame = pick_ico_frame(content, size)
+    if frame is None:
+        return None
+    data, width, bpp = frame
+    if data.startswith(PNG_SIGNATURE):
+        return data, 'image/png'
+    header = struct.pack('<HHH', 0, 1, 1)
+    entry = struct.pack('<BBBBHHII', width % 256, width % 256, 0, 0, 1, bpp, len(data), 22)
+    return header + entry + data, 'image/x-icon'
+
+def transcode_icon(content, size, fmt):
+    """使用 Pillow 缩小并重新编码，返回 (content, content_type)；声明的像素数超出上限时返回 None"""
+    with Image.open(io.BytesIO(content)) as img:
+        # open 只读取文件头，在解码前检查尺寸
+        if img.width * img.height > ICON_NORMALIZE_MAX_PIXELS:
+            return None
+        img.draft('RGBA', (size, size))  # JPEG 等格式可直接按缩小后的尺寸解码
+        img.load()
+        img = img.convert('RGBA') if img.mode not in ('RGB', 'RGBA') else img.copy()
+    if max(img.size) > size:
+        img.thumbnail((size, size), Image.LANCZOS)
+    out = io.BytesIO()
+    if fmt == 'webp':
+        img.save(out, 'WEBP', lossless=True, method=6)
+        return out.getvalue(), 'image/webp'
+    img.save(out, 'PNG', optimize=True)
+    return out.getvalue(), 'image/png'
+
+def normalize_icon(content, content_type):
+    """缓存前的图标规整：挑选 ICO 最佳帧、缩小到 ICON_NORMALIZE_SIZE 并转为紧凑格式
+
+    只在结果更小时替换原图，SVG 等矢量图保持不变。
+    """
+    if not ICON_NORMALIZE or 'svg' in (content_type or ''):
+        return content, content_type
     
-    if not is_cache_valid(cache_path):
-        return None, None
+    result = content, content_type
+    try:
+        picked = normalize_ico(content, ICON_NORMALIZE_SIZE)
+        if picked and len(picked[0]) < len(result[0]):
+            result = picked
+        transcoded = None
+        if Image is not None:
+            transcoded = transcode_icon(result[0], ICON_NORMALIZE_SIZE, ICON_NORMALIZE_FORMAT)
+            if transcoded and len(transcoded[0]) < len(result[0]):
+                result = transcoded
+        if result[0] is not content:
+            outcome = 'normalized'
+        else:
+            outcome = 'oversized' if Image is not None and transcoded is None else 'unchanged'
+    except Exception as e:
+        print(f"图标规整失败: {e}")
+        outcome = 'failed'
+    
+    with icon_normalize_stats_lock:
+        icon_normalize_stats[outcome] += 1
+        icon_normalize_stats['bytes_in'] += len(content)
+        icon_normalize_stats['bytes_out'] += len(result[0])
+    return result
+
+def fetch_icon(icon_url):
+    """从源站获取图标并写入缓存，返回缓存条目 {'content', 'content_type', 'digest', ...}"""
+    # 已有缓存（通常已过期）时向上游发送条件请求
+    cached = load_icon_from_cache(icon_url, record_stats=False)
+    try:
+        result = download_icon(icon_url, cached)
+    except (IconTooLarge, requests.exceptions.RequestException) as e:
+        icon_negative_cache.record(icon_url, *describe_icon_error(e))
+        raise
+    icon_negative_cache.clear(icon_url)
+    
+    if result is None:
+        # 304 Not Modified：沿用已缓存的内容
+        count_icon_cache('revalidated')
+        try:
+            touch_icon_cache(icon_url, cached)
+        except Exception as e:
+            print(f"刷新图标缓存失败: {e}")
+        return cached
     
+    content, content_type, etag, last_modified = result
+    content, content_type = normalize_icon(content, content_type)
+    
+    # 保存到缓存
     try:
-        with open(cache_path, 'rb') as f:
-            content = f.read()
+        save_icon_to_cache(icon_url, content, content_type, etag, last_modified)
+    except Exception as e:
+        print(f"保存图标缓存失败: {e}")
+    
+    return {
+        'content': content,
+        'content_type': content_type,
+        'etag': etag,
+        'last_modified': last_modified,
+        'digest': get_icon_digest(content),
+    }
+
+def download_icon(icon_url, cached=None):
+    """从源站下载图标，返回 (content, content_type, etag, last_modified)，上游未修改时返回 None"""
+    headers = {}
+    if cached:
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+    
+    # 使用 with 确保异常时连接也能归还到连接池
+    with upstream.get(icon_url, headers=headers, stream=True, allow_redirects=True) as response:
+        if response.status_code == 304 and cached:
+            return None
+        response.raise_for_status()
         
-        content_type = 'image/x-icon'  # 默认类型
-        if os.path.exists(meta_path):
-            with open(meta_path, 'r') as f:
-                content_type = f.read().strip() or content_type
+        # 限制文件大小（1MB）
+        try:
+            content_length = int(response.headers.get('Content-Length', ''))
+        except ValueError:
+            content_length = None
+        if content_length and content_length > ICON_MAX_BYTES:
+            raise IconTooLarge()
         
-        return content, content_type
+        # 读取内容：按 Content-Length 预分配缓冲区，分块原地写入，避免反复拼接 bytes
+        content = read_icon_body(response, content_length)
+        
+        # 获取 Content-Type
+        content_type = response.headers.get('Content-Type', 'image/x-icon')
+    
+    return content, content_type, response.headers.get('ETag'), response.headers.get('Last-Modified')
+
+def read_icon_body(response, content_length=None):
+    """把响应体读入预分配的缓冲区，超过上限时立即中止，返回 bytes"""
+    # Content-Length 可能是压缩后的长度，不足时按倍数扩容（均摊线性复制）
+    buffer = bytearray(content_length or 64 * 1024)
+    size = 0
+    for chunk in response.iter_content(chunk_size=8192):
+        end = size + len(chunk)
+        if end > ICON_MAX_BYTES:
+            raise IconTooLarge()
+        if end > len(buffer):
+            buffer.extend(bytes(min(max(len(buffer), end - len(buffer)), ICON_MAX_BYTES - len(buffer))))
+        buffer[size:end] = chunk
+        size = end
+    # WSGI 服务器只接受 bytes，这里复制一次（整体仍是线性的）
+    return bytes(memoryview(buffer)[:size])
+
+def describe_icon_error(e):
+    """把获取图标的异常转换为 (状态码, 错误信息)"""
+    if isinstance(e, IconTooLarge):
+        return 400, '文件过大'
+    if isinstance(e, requests.exceptions.Timeout):
+        return 504, '请求超时'
+    if isinstance(e, requests.exceptions.RequestException):
+        return 502, '获取图标失败'
+    return 500, '服务器错误'
+
+class IconNegativeCache:
+    """上游失败的短期缓存，连续失败时按指数退避延长"""
+
+    def __init__(self, base_ttl, max_ttl, max_entries=10000):
+        self.base_ttl = base_ttl
+        self.max_ttl = max_ttl
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # {icon_url: {'until', 'failures', 'status', 'error'}}
+        self._lock = threading.Lock()
+
+    def get(self, icon_url):
+        """返回仍在退避期内的失败记录"""
+        with self._lock:
+            item = self._data.get(icon_url)
+            if item is None or item['until'] < time.time():
+                return None
+            return item
+
+    def record(self, icon_url, status, error):
+        with self._lock:
+            item = self._data.pop(icon_url, None)
+            failures = item['failures'] + 1 if item else 1
+            ttl = min(self.base_ttl * 2 ** (failures - 1), self.max_ttl)
+            self._data[icon_url] = {
+                'until': time.time() + ttl,
+                'failures': failures,
+                'status': status,
+                'error': error,
+            }
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self, icon_url):
+        with self._lock:
+            self._data.pop(icon_url, None)
+
+    def stats(self):
+        with self._lock:
+            now = time.time()
+            return {
+                'entries': len(self._data),
+                'active': sum(1 for item in self._data.values() if item['until'] >= now),
+            }
+
+icon_negative_cache = IconNegativeCache(ICON_NEGATIVE_TTL, ICON_NEGATIVE_MAX_TTL)
+
+# 后台刷新过期图标
+icon_refresh_executor = ThreadPoolExecutor(max_workers=ICON_REFRESH_WORKERS)
+icon_refreshing = set()
+icon_refreshing_lock = threading.Lock()
+
+def refresh_icon_async(icon_url):
+    """在后台重新获取图标（同一 URL 同时只刷新一次，排队数超出上限时丢弃）"""
+    if icon_negative_cache.get(icon_url):
+        return
+    with icon_refreshing_lock:
+        if icon_url in icon_refreshing:
+            return
+        if len(icon_refreshing) >= ICON_REFRESH_MAX_PENDING:
+            count_icon_cache('refresh_dropped')
+            return
+        icon_refreshing.add(icon_url)
+    count_icon_cache('refreshes')
+    icon_refresh_executor.submit(_refresh_icon, icon_url)
+
+def _refresh_icon(icon_url):
+    try:
+        # 排队期间可能已被代理请求或预热刷新过
+        cached = load_icon_from_cache(icon_url, record_stats=False)
+        if (cached and not cached['stale']) or icon_negative_cache.get(icon_url):
+            return
+        icon_flight.do(icon_url, lambda: fetch_icon(icon_url))
     except Exception:
-        return None, None
+        count_icon_cache('refresh_failures')
+    finally:
+        with icon_refreshing_lock:
+            icon_refreshing.discard(icon_url)
+
+class IconWarmer:
+    """图标预热队列：链接变更或启动时在后台提前获取图标"""
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._pid = None
+        self.in_progress = 0
+        self.counts = {'fetched': 0, 'skipped': 0, 'failed': 0}
+        self.boot = {'state': 'idle', 'total': 0, 'started_at': None}
+        self._boot_lock = None  # 启动预热的文件锁
+        self._boot_owner = False  # 启动预热是否在本进程中执行
+        self._publish_lock = threading.Lock()
+        self._published = (0.0, -1)  # 上次写入进度文件的 (时间, 已完成数)
+
+    def ensure_running(self):
+        """确保当前进程中工作线程已启动"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            for i in range(self.workers):
+                threading.Thread(target=self._run, name=f'icon-warmer-{i}', daemon=True).start()
+
+    def enqueue(self, icon_url):
+        """加入预热队列（已在队列中的忽略）"""
+        self.ensure_running()
+        with self._lock:
+            if icon_url in self._queued:
+                return
+            self._queued.add(icon_url)
+        self._queue.put(icon_url)
+
+    def warm_all_links(self):
+        """预热所有链接的图标"""
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute('SELECT url, icon FROM links')
+        urls = {get_link_icon_url(row['url'], row['icon']) for row in cursor.fetchall()}
+        conn.close()
+        self._boot_owner = True
+        self.boot = {'state': 'running', 'total': len(urls), 'completed': 0,
+                     'started_at': time.time(), 'worker': os.getpid()}
+        if not urls:
+            # 没有链接时不会有任务完成，直接结束
+            self.boot.update(state='done', finished_at=time.time())
+        self._publish_boot(dict(self.boot))
+        for icon_url in urls:
+            self.enqueue(icon_url)
+
+    def _status_path(self):
+        return os.path.join(ICON_CACHE_DIR, '.warmup.json')
+
+    def _publish_boot(self, boot):
+        """把启动预热进度写入图标缓存目录，供其他 worker 读取（运行中最多每秒写一次）"""
+        with self._publish_lock:
+            now = time.monotonic()
+            last_time, last_completed = self._published
+            # 并发写入时不让旧的进度覆盖新的
+            if boot.get('completed', 0) < last_completed:
+                return
+            if boot['state'] == 'running' and last_completed >= 0 and now - last_time < 1:
+                return
+            self._published = (now, boot.get('completed', 0))
+            try:
+                os.makedirs(ICON_CACHE_DIR, mode=0o755, exist_ok=True)
+                write_file_atomic(self._status_path(), json.dumps(boot).encode('utf-8'))
+            except OSError as e:
+                print(f"写入图标预热进度失败: {e}")
+
+    def _read_boot(self):
+        """启动预热进度：本进程执行时直接返回，否则读取执行预热的 worker 写入的文件"""
+        if self._boot_owner or not ICON_WARMUP_ON_START:
+            return dict(self.boot)
+        try:
+            with open(self._status_path(), 'rb') as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return dict(self.boot)
+
+    def _run(self):
+        while True:
+            icon_url = self._queue.get()
+            with self._lock:
+                self._queued.discard(icon_url)
+                self.in_progress += 1
+            result = self._warm(icon_url)
+            boot = None
+            with self._lock:
+                self.in_progress -= 1
+                self.counts[result] += 1
+                if self.boot['state'] == 'running':
+                    self.boot['completed'] += 1
+                    if self._queue.empty() and self.in_progress == 0:
+                        self.boot['state'] = 'done'
+                        self.boot['finished_at'] = time.time()
+                    boot = dict(self.boot)
+            if boot:
+                self._publish_boot(boot)
+
+    def _warm(self, icon_url):
+        """获取单个图标，返回结果类别"""
+        try:
+            cached = load_icon_from_cache(icon_url, record_stats=False)
+            if (cached and not cached['stale']) or icon_negative_cache.get(icon_url) or not is_valid_url(icon_url):
+                return 'skipped'
+            icon_flight.do(icon_url, lambda: fetch_icon(icon_url))
+            return 'fetched'
+        except Exception:
+            return 'failed'
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self.counts,
+                workers=self.workers,
+                queue_length=self._queue.qsize(),
+                in_progress=self.in_progress,
+                boot=self._read_boot()
+            )
+
+icon_warmer = IconWarmer(ICON_WARMUP_WORKERS)
+
+def start_boot_warmup():
+    """启动时预热图标（多 worker 时通过文件锁只由一个进程执行）"""
+    if not ICON_WARMUP_ON_START:
+        return
+    if fcntl is not None:
+        try:
+            os.makedirs(ICON_CACHE_DIR, mode=0o755, exist_ok=True)
+            lock_file = open(os.path.join(ICON_CACHE_DIR, '.warmup.lock'), 'w')
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return
+        # 锁随进程一直持有，直到进程退出
+        icon_warmer._boot_lock = lock_file
+    try:
+        icon_warmer.warm_all_links()
+    except Exception as e:
+        print(f"图标预热失败: {e}")
+
+def icon_response(entry, cache_status, max_age):
+    """构造图标响应，浏览器缓存的 ETag 一致时返回 304"""
+    headers = {
+        'Cache-Control': f'public, max-age={max_age}',
+        'ETag': f'"{entry["digest"]}"',
+        'X-Cache': cache_status,
+    }
+    if request.if_none_match.contains_weak(entry['digest']):
+        count_icon_cache('not_modified')
+        return Response(status=304, headers=headers)
+    headers['Content-Length'] = str(len(entry['content']))
+    return Response(entry['content'], mimetype=entry['content_type'], headers=headers)
 
 @app.route('/api/icon-proxy', methods=['GET'])
 def api_icon_proxy():
@@ -578,83 +2436,275 @@ def api_icon_proxy():
         return jsonify({'error': 'URL 格式无效或包含不安全内容'}), 400
     
     # 尝试从缓存加载
-    cached_content, cached_type = load_icon_from_cache(icon_url)
-    if cached_content:
-        return Response(
-            cached_content,
-            mimetype=cached_type,
-            headers={
-                'Cache-Control': 'public, max-age=86400',
-                'Content-Length': str(len(cached_content)),
-                'X-Cache': 'HIT'  # 标记缓存命中
-            }
-        )
-    
-    # 缓存未命中，从源站获取
+    cached = load_icon_from_cache(icon_url)
+    if cached:
+        if cached['stale']:
+            # 已过期：先返回旧图标，同时在后台刷新
+            count_icon_cache('stale_served')
+            refresh_icon_async(icon_url)
+        # 标记缓存命中
+        return icon_response(cached, 'STALE' if cached['stale'] else 'HIT', 3600 if cached['stale'] else 86400)
+    
+    # 上游近期失败过，在退避期内直接返回失败结果
+    failure = icon_negative_cache.get(icon_url)
+    if failure:
+        count_icon_cache('negative_hits')
+        return jsonify({'error': failure['error']}), failure['status'], {'X-Cache': 'NEGATIVE'}
+    
+    # 缓存未命中，从源站获取（同一 URL 的并发请求只回源一次）
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
-        }
-        
-        response = requests.get(
-            icon_url,
-            headers=headers,
-            timeout=10,
-            stream=True,
-            allow_redirects=True
-        )
-        
-        response.raise_for_status()
-        
-        # 限制文件大小（1MB）
-        content_length = response.headers.get('Content-Length')
-        if content_length and int(content_length) > 1024 * 1024:
-            return jsonify({'error': '文件过大'}), 400
+        entry = icon_flight.do(icon_url, lambda: fetch_icon(icon_url))
+        return icon_response(entry, 'MISS', 86400)  # 标记缓存未命中
         
-        # 读取内容
-        content = b''
-        max_size = 1024 * 1024
-        for chunk in response.iter_content(chunk_size=8192):
-            content += chunk
-            if len(content) > max_size:
-                return jsonify({'error': '文件过大'}), 400
+    except Exception as e:
+        status, error = describe_icon_error(e)
+        return jsonify({'error': error}), status
+
+@app.route('/api/icons/batch', methods=['POST'])
+def api_icons_batch():
+    """批量获取图标：已缓存的以 data URI 返回，未缓存的由前端回退到单个代理请求
+
+    POST 响应无法被浏览器缓存，前端把收到的图标连同摘要保存在本地，
+    请求时通过 known（{url: digest}）告知已有的版本，摘要一致的图标不再重复下发。
+    """
+    data = request.json or {}
+    urls = data.get('urls')
+    if not isinstance(urls, list):
+        return jsonify({'error': '缺少 urls 参数'}), 400
+    if len(urls) > ICON_BATCH_MAX_URLS:
+        return jsonify({'error': f'一次最多 {ICON_BATCH_MAX_URLS} 个图标'}), 400
+    known = data.get('known')
+    if not isinstance(known, dict):
+        known = {}
+    
+    icons = {}
+    for icon_url in urls:
+        if not isinstance(icon_url, str) or icon_url in icons:
+            continue
+        cached = load_icon_from_cache(icon_url)
+        if cached:
+            if cached['stale']:
+                count_icon_cache('stale_served')
+                refresh_icon_async(icon_url)
+            if len(cached['content']) > ICON_BATCH_MAX_ICON_BYTES:
+                # 过大的图标不内联，由前端单独请求
+                icons[icon_url] = {'status': 'SKIP'}
+                continue
+            icon = {'status': 'STALE' if cached['stale'] else 'HIT', 'digest': cached['digest']}
+            if known.get(icon_url) == cached['digest']:
+                # 前端已保存同一版本
+                count_icon_cache('batch_unchanged')
+            else:
+                encoded = base64.b64encode(cached['content']).decode('ascii')
+                icon['data'] = f"data:{cached['content_type']};base64,{encoded}"
+            icons[icon_url] = icon
+            continue
         
-        # 获取 Content-Type
-        content_type = response.headers.get('Content-Type', 'image/x-icon')
+        # 只有需要回源时才做 URL 安全校验
+        if not is_valid_url(icon_url):
+            icons[icon_url] = {'status': 'INVALID'}
+        elif icon_negative_cache.get(icon_url):
+            count_icon_cache('negative_hits')
+            icons[icon_url] = {'status': 'NEGATIVE'}
+        else:
+            # 不在这里回源：前端会对 MISS 回退到 /api/icon-proxy，由它获取并缓存
+            icons[icon_url] = {'status': 'MISS'}
+    
+    return jsonify({'icons': icons})
+
+# ==================== 内容版本 ====================
+
+def get_content_etag(view, versions=None):
+    """视图 ETag：由视图名和它依赖的版本计数组成，分类和链接的任何修改都会递增 content 版本"""
+    versions = get_versions() if versions is None else versions
+    return '-'.join([view] + [str(versions.get(name, 0)) for name in CONTENT_VIEWS[view][1]])
+
+def content_response(response, etag, private=False):
+    """为分类/链接响应附加 ETag 和缓存头（浏览器每次都需重新验证）"""
+    # 弱 ETag：gzip 与未压缩的响应共用同一个 ETag
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache' if private else 'no-cache'
+    return response
+
+def content_not_modified(etag, private=False):
+    """客户端持有的 ETag 仍然有效时直接返回 304，不查询数据"""
+    if request.if_none_match.contains_weak(etag):
+        return content_response(Response(status=304), etag, private)
+    return None
+
+CONTENT_GZIP_MIN_BYTES = 1024  # 小于该大小的内容不预先压缩
+
+def query_rows(cursor, sql):
+    """执行查询并转换为字典列表"""
+    cursor.execute(sql)
+    return [dict(row) for row in cursor.fetchall()]
+
+CATEGORIES_SQL = 'SELECT * FROM categories ORDER BY sort_order, id'
+LINKS_PUBLIC_SQL = 'SELECT * FROM links WHERE is_hidden = 0 ORDER BY sort_order, id'
+LINKS_HIDDEN_SQL = 'SELECT * FROM links ORDER BY sort_order, id'
+
+def build_site_settings(config):
+    """从配置字典生成公开的站点设置"""
+    return {
+        'site_title': config.get('site_title') or 'Oasis-Nav',
+        'site_icon': config.get('site_icon') or '🥭',
+        'favicon': config.get('favicon') or '',
+        'footer_text': config.get('footer_text') or '',
+        'bookmark_hidden': config.get('bookmark_hidden') == '1',  # 书签是否隐藏
+        'project_url': 'https://github.com/ecouus/Oasis-Nav'  # 固定的项目地址
+    }
+
+def build_bootstrap(cursor, links_sql):
+    """首页所需的全部数据：站点设置、默认分类、分类和链接"""
+    cursor.execute('SELECT key, value FROM config')
+    config = {row['key']: row['value'] for row in cursor.fetchall()}
+    default_id = config.get('default_category_id')
+    return {
+        'settings': build_site_settings(config),
+        'default_category_id': int(default_id) if default_id else None,
+        'categories': query_rows(cursor, CATEGORIES_SQL),
+        'links': query_rows(cursor, links_sql),
+    }
+
+# 视图 -> (生成数据的函数, 依赖的版本计数)
+CONTENT_VIEWS = {
+    'categories': (lambda cursor: query_rows(cursor, CATEGORIES_SQL), ('content',)),
+    'links-public': (lambda cursor: query_rows(cursor, LINKS_PUBLIC_SQL), ('content',)),
+    'links-hidden': (lambda cursor: query_rows(cursor, LINKS_HIDDEN_SQL), ('content',)),
+    'bootstrap-public': (lambda cursor: build_bootstrap(cursor, LINKS_PUBLIC_SQL), ('content', 'config')),
+    'bootstrap-hidden': (lambda cursor: build_bootstrap(cursor, LINKS_HIDDEN_SQL), ('content', 'config')),
+}
+
+class ContentCache:
+    """首页数据的序列化缓存：按视图保存 JSON 字节和预压缩的 gzip 字节
+
+    视图依赖的版本计数变化后，首次读取时重建，其余读取只是一次字典查找。
+    """
+
+    def __init__(self):
+        self._entries = {}  # view -> {'versions', 'etag', 'body', 'gzip'}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'rebuilds': 0, 'rebuild_ms': {}}
+
+    @staticmethod
+    def _is_stale(entry, view, versions):
+        return entry is None or any(
+            entry['versions'].get(name, 0) < versions.get(name, 0)
+            for name in CONTENT_VIEWS[view][1]
+        )
+
+    def get(self, view, versions):
+        """获取不旧于 versions 的缓存条目"""
+        entry = self._entries.get(view)
+        if self._is_stale(entry, view, versions):
+            with self._lock:
+                entry = self._entries.get(view)
+                if self._is_stale(entry, view, versions):
+                    entry = self._build(view)
+                    self._entries[view] = entry
+                    return entry
+        self._stats['hits'] += 1
+        return entry
+
+    def _build(self, view):
+        """在同一个读事务中读取版本和数据，序列化后返回新条目"""
+        started = time.perf_counter()
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute('BEGIN')
+        cursor.execute('SELECT name, value FROM versions')
+        versions = {row['name']: row['value'] for row in cursor.fetchall()}
+        data = CONTENT_VIEWS[view][0](cursor)
+        conn.commit()
+        conn.close()
         
-        # 保存到缓存
-        try:
-            save_icon_to_cache(icon_url, content, content_type)
-        except Exception as e:
-            print(f"保存图标缓存失败: {e}")
+        body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode()
+        compressed = compress_payload(body)
         
-        return Response(
-            content,
-            mimetype=content_type,
-            headers={
-                'Cache-Control': 'public, max-age=86400',
-                'Content-Length': str(len(content)),
-                'X-Cache': 'MISS'  # 标记缓存未命中
-            }
+        elapsed = (time.perf_counter() - started) * 1000
+        self._stats['rebuilds'] += 1
+        self._stats['rebuild_ms'][view] = round(elapsed, 2)
+        etag = get_content_etag(view, versions)
+        print(f"内容缓存重建: {etag}, {len(body)} 字节"
+              f"{f' (gzip {len(compressed)})' if compressed else ''}, 耗时 {elapsed:.1f}ms")
+        return {'versions': versions, 'etag': etag, 'body': body, 'gzip': compressed}
+
+    def stats(self):
+        return dict(
+            self._stats,
+            rebuild_ms=dict(self._stats['rebuild_ms']),
+            views={view: {'etag': e['etag'], 'bytes': len(e['body']),
+                          'gzip_bytes': len(e['gzip']) if e['gzip'] else None}
+                   for view, e in list(self._entries.items())}
         )
-        
-    except requests.exceptions.Timeout:
-        return jsonify({'error': '请求超时'}), 504
-    except requests.exceptions.RequestException as e:
-        return jsonify({'error': f'获取图标失败'}), 502
-    except Exception as e:
-        return jsonify({'error': '服务器错误'}), 500
+
+content_cache = ContentCache()
+
+def compress_payload(body):
+    """预压缩响应体，太小或压缩无收益时返回 None"""
+    if len(body) < CONTENT_GZIP_MIN_BYTES:
+        return None
+    compressed = gzip.compress(body, 6)
+    return compressed if len(compressed) < len(body) else None
+
+def encoded_response(body, compressed, mimetype):
+    """客户端支持时返回预压缩的 gzip，否则返回原始字节"""
+    if compressed and 'gzip' in request.accept_encodings:
+        response = Response(compressed, mimetype=mimetype)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(body, mimetype=mimetype)
+    response.vary.add('Accept-Encoding')
+    return response
+
+def content_payload_response(view, private=False):
+    """直接返回缓存的 JSON 字节"""
+    entry = content_cache.get(view, get_versions())
+    response = encoded_response(entry['body'], entry['gzip'], 'application/json')
+    return content_response(response, entry['etag'], private)
+
+def cached_view_response(view, private=False):
+    """视图响应：ETag 未变时返回 304，否则返回缓存的 JSON"""
+    response = content_not_modified(get_content_etag(view), private)
+    if not response:
+        response = content_payload_response(view, private)
+    return response
+
+def can_view_hidden():
+    """当前请求是否有权查看隐藏链接"""
+    # 方式1: 通过隐藏密码获取的临时 token
+    if request.args.get('show_hidden') and request.args.get('hidden_token'):
+        token_info = token_store.get('hidden', request.args.get('hidden_token'))
+        if token_info is not None:
+            # 检查 IP 绑定（如果开启）
+            ip_binding_enabled = get_config('ip_binding_enabled') == '1'
+            if not ip_binding_enabled or token_info.get('ip') == get_client_ip():
+                return True
+    
+    # 方式2: 后台管理员登录的 token（Bearer token）
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        admin_token = auth_header.replace('Bearer ', '')
+        token_info = token_store.get('token', admin_token) if admin_token else None
+        if token_info is not None:
+            # 检查 IP 绑定（如果开启）
+            ip_binding_enabled = get_config('ip_binding_enabled') == '1'
+            if not ip_binding_enabled or token_info.get('ip') == get_client_ip():
+                return True
+    return False
+
+@app.route('/api/bootstrap', methods=['GET'])
+def api_bootstrap():
+    """首页一次性加载：站点设置、默认分类、分类和链接，共用一个 ETag"""
+    can_see_hidden = can_view_hidden()
+    response = cached_view_response('bootstrap-hidden' if can_see_hidden else 'bootstrap-public', private=can_see_hidden)
+    response.vary.add('Authorization')
+    return response
 
 @app.route('/api/categories', methods=['GET'])
 def api_get_categories():
     """获取所有分类"""
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM categories ORDER BY sort_order, id')
-    categories = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return jsonify(categories)
+    return cached_view_response('categories')
 
 @app.route('/api/categories', methods=['POST'])
 @require_auth
@@ -673,8 +2723,9 @@ def api_create_category():
         'INSERT INTO categories (name, parent_id, sort_order) VALUES (?, ?, ?)',
         (name, data.get('parent_id'), data.get('sort_order', 0))
     )
-    conn.commit()
     category_id = cursor.lastrowid
+    bump_version(cursor, 'content')
+    conn.commit()
     conn.close()
     return jsonify({'id': category_id, 'message': '创建成功'})
 
@@ -695,6 +2746,7 @@ def api_update_category(id):
         'UPDATE categories SET name = ?, parent_id = ?, sort_order = ? WHERE id = ?',
         (name, data.get('parent_id'), data.get('sort_order', 0), id)
     )
+    bump_version(cursor, 'content')
     conn.commit()
     conn.close()
     return jsonify({'message': '更新成功'})
@@ -707,6 +2759,7 @@ def api_delete_category(id):
     cursor = conn.cursor()
     cursor.execute('DELETE FROM categories WHERE id = ?', (id,))
     cursor.execute('UPDATE links SET category_id = NULL WHERE category_id = ?', (id,))
+    bump_version(cursor, 'content')
     conn.commit()
     conn.close()
     
@@ -749,46 +2802,11 @@ def api_set_default_category():
 @app.route('/api/links', methods=['GET'])
 def api_get_links():
     """获取链接列表"""
-    show_hidden = request.args.get('show_hidden')
-    hidden_token = request.args.get('hidden_token')
-    
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # 检查是否有权限查看隐藏内容
-    can_see_hidden = False
-    
-    # 方式1: 通过隐藏密码获取的临时 token
-    if show_hidden and hidden_token:
-        token_key = f'hidden_{hidden_token}'
-        if token_key in active_tokens:
-            token_info = active_tokens[token_key]
-            if token_info['expires'] > datetime.now():
-                # 检查 IP 绑定（如果开启）
-                ip_binding_enabled = get_config('ip_binding_enabled') == '1'
-                if not ip_binding_enabled or token_info.get('ip') == get_client_ip():
-                    can_see_hidden = True
-    
-    # 方式2: 后台管理员登录的 token（Bearer token）
-    auth_header = request.headers.get('Authorization', '')
-    if auth_header.startswith('Bearer '):
-        admin_token = auth_header.replace('Bearer ', '')
-        if admin_token in active_tokens:
-            token_info = active_tokens[admin_token]
-            if token_info['expires'] > datetime.now():
-                # 检查 IP 绑定（如果开启）
-                ip_binding_enabled = get_config('ip_binding_enabled') == '1'
-                if not ip_binding_enabled or token_info.get('ip') == get_client_ip():
-                    can_see_hidden = True
-    
-    if can_see_hidden:
-        cursor.execute('SELECT * FROM links ORDER BY sort_order, id')
-    else:
-        cursor.execute('SELECT * FROM links WHERE is_hidden = 0 ORDER BY sort_order, id')
-    
-    links = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return jsonify(links)
+    # 公开视图和含隐藏链接的视图使用不同的 ETag，后者不允许共享缓存
+    can_see_hidden = can_view_hidden()
+    response = cached_view_response('links-hidden' if can_see_hidden else 'links-public', private=can_see_hidden)
+    response.vary.add('Authorization')
+    return response
 
 @app.route('/api/links', methods=['POST'])
 @require_auth
@@ -823,9 +2841,13 @@ def api_create_link():
             data.get('sort_order', 0)
         )
     )
-    conn.commit()
     link_id = cursor.lastrowid
+    bump_version(cursor, 'content')
+    conn.commit()
     conn.close()
+    
+    # 在后台预热图标，首个访客无需等待回源
+    icon_warmer.enqueue(get_link_icon_url(url, data.get('icon')))
     return jsonify({'id': link_id, 'message': '创建成功'})
 
 @app.route('/api/links/<int:id>', methods=['PUT'])
@@ -862,8 +2884,12 @@ def api_update_link(id):
             id
         )
     )
+    bump_version(cursor, 'content')
     conn.commit()
     conn.close()
+    
+    # 在后台预热图标
+    icon_warmer.enqueue(get_link_icon_url(url, data.get('icon')))
     return jsonify({'message': '更新成功'})
 
 @app.route('/api/links/<int:id>', methods=['DELETE'])
@@ -873,40 +2899,79 @@ def api_delete_link(id):
     conn = get_db()
     cursor = conn.cursor()
     cursor.execute('DELETE FROM links WHERE id = ?', (id,))
+    bump_version(cursor, 'content')
     conn.commit()
     conn.close()
     return jsonify({'message': '删除成功'})
 
+def parse_reorder(data):
+    """校验排序数据 [{id: 1, sort_order: 0}, ...]，返回 [(sort_order, id), ...]，格式错误时返回 None"""
+    orders = (data or {}).get('orders', [])
+    if not isinstance(orders, list):
+        return None
+    rows = []
+    seen = set()
+    for item in orders:
+        if not isinstance(item, dict):
+            return None
+        item_id, sort_order = item.get('id'), item.get('sort_order')
+        if not all(isinstance(v, int) and not isinstance(v, bool) for v in (item_id, sort_order)):
+            return None
+        if item_id in seen:
+            return None
+        seen.add(item_id)
+        rows.append((sort_order, item_id))
+    return rows
+
+def apply_reorder(table, rows):
+    """在一个写事务中批量更新排序，存在不存在的 ID 时整体回滚并返回这些 ID"""
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    before = conn.total_changes
+    cursor.executemany(f'UPDATE {table} SET sort_order = ? WHERE id = ?', rows)
+    
+    missing = []
+    if conn.total_changes - before != len(rows):
+        # 只有数量对不上时才逐批查出缺失的 ID
+        ids = [item_id for _, item_id in rows]
+        found = set()
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            cursor.execute(f"SELECT id FROM {table} WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+            found.update(row['id'] for row in cursor.fetchall())
+        missing = [item_id for item_id in ids if item_id not in found]
+    
+    if missing:
+        conn.rollback()
+    else:
+        bump_version(cursor, 'content')
+        conn.commit()
+    conn.close()
+    return missing
+
 @app.route('/api/links/reorder', methods=['PUT'])
 @require_auth
 def api_reorder_links():
     """批量更新链接排序"""
-    data = request.json
-    orders = data.get('orders', [])  # [{id: 1, sort_order: 0}, ...]
-    
-    conn = get_db()
-    cursor = conn.cursor()
-    for item in orders:
-        cursor.execute('UPDATE links SET sort_order = ? WHERE id = ?', 
-                      (item['sort_order'], item['id']))
-    conn.commit()
-    conn.close()
+    rows = parse_reorder(request.json)
+    if rows is None:
+        return jsonify({'error': '排序数据格式错误'}), 400
+    missing = apply_reorder('links', rows)
+    if missing:
+        return jsonify({'error': '排序数据包含不存在的链接', 'unknown_ids': missing}), 400
     return jsonify({'message': '排序更新成功'})
 
 @app.route('/api/categories/reorder', methods=['PUT'])
 @require_auth
 def api_reorder_categories():
     """批量更新分类排序"""
-    data = request.json
-    orders = data.get('orders', [])  # [{id: 1, sort_order: 0}, ...]
-    
-    conn = get_db()
-    cursor = conn.cursor()
-    for item in orders:
-        cursor.execute('UPDATE categories SET sort_order = ? WHERE id = ?', 
-                      (item['sort_order'], item['id']))
-    conn.commit()
-    conn.close()
+    rows = parse_reorder(request.json)
+    if rows is None:
+        return jsonify({'error': '排序数据格式错误'}), 400
+    missing = apply_reorder('categories', rows)
+    if missing:
+        return jsonify({'error': '排序数据包含不存在的分类', 'unknown_ids': missing}), 400
     return jsonify({'message': '排序更新成功'})
 
 @app.route('/api/config/hidden-password', methods=['PUT'])
@@ -923,14 +2988,7 @@ def api_update_hidden_password():
 @app.route('/api/site-settings', methods=['GET'])
 def api_get_site_settings():
     """获取站点设置（公开）"""
-    return jsonify({
-        'site_title': get_config('site_title') or 'Oasis-Nav',
-        'site_icon': get_config('site_icon') or '🥭',
-        'favicon': get_config('favicon') or '',
-        'footer_text': get_config('footer_text') or '',
-        'bookmark_hidden': get_config('bookmark_hidden') == '1',  # 书签是否隐藏
-        'project_url': 'https://github.com/ecouus/Oasis-Nav'  # 固定的项目地址
-    })
+    return jsonify(build_site_settings(load_config()))
 
 @app.route('/api/site-settings', methods=['PUT'])
 @require_auth
@@ -1038,6 +3096,540 @@ def api_update_security_settings():
         set_config('ip_binding_enabled', '1' if data['ip_binding_enabled'] else '0')
     return jsonify({'message': '安全设置更新成功'})
 
+@app.route('/api/stats', methods=['GET'])
+@require_auth
+def api_get_stats():
+    """运行状态统计（仅管理员）"""
+    return jsonify({
+        'pid': os.getpid(),
+        'db_pool': db_pool.stats(),
+        'sqlite': dict(get_db_settings(), wal_checkpoint=wal_checkpoint_stats),
+        'token_store': token_store.stats(),
+        'hash_pool': hash_pool.stats(),
+        'icon_fetch': icon_flight.stats(),
+        'upstream': upstream.stats(),
+        'icon_warmup': icon_warmer.stats(),
+        'icon_cache': dict(
+            icon_cache_stats,
+            backend=icon_store.name,
+            memory=icon_memory_cache.stats(),
+            negative=icon_negative_cache.stats(),
+            gc=icon_gc_stats
+        ),
+        'content_cache': content_cache.stats(),
+        'icon_normalize': dict(
+            icon_normalize_stats,
+            enabled=ICON_NORMALIZE,
+            engine='pillow' if Image is not None else 'builtin'
+        ),
+        'background_tasks': {name: task.stats() for name, task in background_tasks.items()}
+    })
+
+@app.route('/api/icons/warmup', methods=['GET'])
+@require_auth
+def api_get_icon_warmup():
+    """图标预热进度（仅管理员）：boot 为全局的启动预热进度，其余计数只统计响应请求的 worker"""
+    return jsonify(icon_warmer.stats())
+
+# ==================== 搜索 ====================
+
+SEARCH_MAX_LIMIT = 100  # 每页最多结果数
+SEARCH_MAX_TERMS = 8  # 最多使用的关键词数
+SEARCH_MIN_FTS_TERM = 3  # trigram 分词只能匹配至少 3 个字符的关键词，更短的用 LIKE 过滤
+SEARCH_WEIGHTS = {'title': 10.0, 'description': 3.0, 'url': 1.0}  # bm25 列权重
+
+def escape_like(term):
+    """转义 LIKE 通配符"""
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def search_rows(cursor, table, terms, where, params, limit, offset):
+    """搜索 table：长关键词走 FTS5 并按 bm25 排序，其余关键词（或不支持 FTS5 时）用 LIKE 过滤"""
+    columns = SEARCH_INDEXES[table]
+    long_terms = [t for t in terms if len(t) >= SEARCH_MIN_FTS_TERM] if search_fts_enabled else []
+    conditions, args = list(where), list(params)
+    for term in terms:
+        if term in long_terms:
+            continue
+        conditions.append('(' + ' OR '.join(f"t.{c} LIKE ? ESCAPE '\\'" for c in columns) + ')')
+        args.extend([f'%{escape_like(term)}%'] * len(columns))
+    
+    if long_terms:
+        fts = f'{table}_fts'
+        # 每个关键词作为短语，多个关键词同时满足
+        match = ' AND '.join('"' + t.replace('"', '""') + '"' for t in long_terms)
+        weights = ', '.join(str(SEARCH_WEIGHTS[c]) for c in columns)
+        sql = f'''SELECT t.* FROM {fts} JOIN {table} t ON t.id = {fts}.rowid
+                  WHERE {fts} MATCH ? {''.join(' AND ' + c for c in conditions)}
+                  ORDER BY bm25({fts}, {weights}) LIMIT ? OFFSET ?'''
+        args.insert(0, match)
+    else:
+        # 标题以关键词开头的排在前面
+        sql = f'''SELECT t.* FROM {table} t WHERE {' AND '.join(conditions)}
+                  ORDER BY t.title LIKE ? ESCAPE '\\' DESC, t.sort_order, t.id LIMIT ? OFFSET ?'''
+        args.append(f'{escape_like(terms[0])}%')
+    cursor.execute(sql, args + [limit, offset])
+    return [dict(row) for row in cursor.fetchall()]
+
+@app.route('/api/search', methods=['GET'])
+def api_search():
+    """搜索链接（type=links）或书签（type=bookmarks），按相关度排序并分页"""
+    query = request.args.get('q', '').strip()
+    kind = request.args.get('type', 'links')
+    if kind not in ('links', 'bookmarks'):
+        return jsonify({'error': '不支持的搜索类型'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), SEARCH_MAX_LIMIT)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({'error': '分页参数无效'}), 400
+    
+    # 与 /api/links、/api/bookmarks 相同的权限规则
+    where = []
+    if kind == 'bookmarks':
+        error = check_bookmark_auth()
+        if error:
+            return error
+    elif not can_view_hidden():
+        where.append('t.is_hidden = 0')
+    
+    terms = query.split()[:SEARCH_MAX_TERMS]
+    results = []
+    if terms:
+        conn = get_db()
+        # 多取一条用于判断是否还有下一页
+        results = search_rows(conn.cursor(), kind, terms, where, [], limit + 1, offset)
+        conn.close()
+    
+    response = jsonify({
+        'query': query,
+        'results': results[:limit],
+        'offset': offset,
+        'limit': limit,
+        'has_more': len(results) > limit,
+        'engine': 'fts5' if search_fts_enabled else 'like'
+    })
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+# ==================== 导入导出 ====================
+
+IMPORT_BATCH_SIZE = 500  # 每个写事务插入的链接数
+IMPORT_DEFAULT_CATEGORY = '未分类'  # 不在任何文件夹中的链接放入该分类
+EXPORT_CHUNK_SIZE = 64 * 1024  # 导出时每次写出的字节数
+
+def iter_upload_text(stream, chunk_size=64 * 1024):
+    """按块读取上传内容并增量解码为文本（兼容带 BOM 的 UTF-8）"""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+class LinkImporter:
+    """批量导入链接：文件夹映射为分类（最多两级，更深的并入第二级），链接攒够一批后在一个写事务中插入
+
+    解析上传内容时不持有写锁，只有写入每批数据时才短暂加锁。
+    """
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.batch = []
+        self.stats = {'imported': 0, 'duplicates': 0, 'invalid': 0, 'categories_created': 0}
+        self._json_categories = {}  # JSON 中的分类 id -> 文件夹路径
+        
+        self.conn = get_db()
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT id, name, parent_id FROM categories')
+        self.categories = {(row['name'], row['parent_id']): row['id'] for row in cursor.fetchall()}
+        cursor.execute('SELECT COALESCE(MAX(sort_order), 0) FROM categories')
+        self.category_sort = cursor.fetchone()[0]
+        cursor.execute('SELECT category_id, MAX(sort_order) FROM links GROUP BY category_id')
+        self.link_sort = {row[0]: row[1] or 0 for row in cursor.fetchall()}
+        cursor.execute('SELECT url FROM links')
+        self.urls = {row['url'] for row in cursor.fetchall()}
+
+    def add_link(self, title, url, path=(), description=None, icon=None, is_hidden=False):
+        """加入一条链接，path 为所在文件夹的名称列表"""
+        url = (url or '').strip()
+        if not url or not urlparse(url).scheme or not is_valid_url(url):
+            self.stats['invalid'] += 1
+            return
+        if url in self.urls:
+            self.stats['duplicates'] += 1
+            return
+        self.urls.add(url)
+        
+        # 只保留两级分类，更深的文件夹并入第二级
+        path = tuple(name.strip() or '未命名' for name in path if name is not None)[:2] or (IMPORT_DEFAULT_CATEGORY,)
+        self.batch.append(((title or '').strip() or url, url, icon or None, description or None, path, 1 if is_hidden else 0))
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def add_json_record(self, kind, item):
+        """处理 JSON 导入中的一条分类或链接记录"""
+        if not isinstance(item, dict):
+            raise ValueError('记录必须是对象')
+        for field in ('id', 'parent_id', 'category_id'):
+            if not isinstance(item.get(field), (int, str, type(None))):
+                raise ValueError(f'{field} 必须是整数或字符串')
+        if kind == 'category':
+            parent = self._json_categories.get(item.get('parent_id'), ())
+            self._json_categories[item.get('id')] = parent + (str(item.get('name') or ''),)
+            return
+        for field in ('description', 'icon'):
+            if not isinstance(item.get(field), (str, type(None))):
+                raise ValueError(f'{field} 必须是字符串')
+        path = item.get('category')
+        if isinstance(path, str):
+            path = (path,)
+        elif isinstance(path, list):
+            if not all(isinstance(name, str) for name in path):
+                raise ValueError('category 必须是字符串数组')
+        else:
+            path = self._json_categories.get(item.get('category_id'), ())
+        self.add_link(
+            str(item.get('title') or ''), str(item.get('url') or ''), list(path),
+            item.get('description'), item.get('icon'), bool(item.get('is_hidden'))
+        )
+
+    def _category_id(self, cursor, path, created):
+        """按路径查找或创建分类，返回最后一级的 ID"""
+        parent_id = None
+        for name in path:
+            key = (name, parent_id)
+            category_id = self.categories.get(key) or created.get(key)
+            if category_id is None:
+                self.category_sort += 1
+                cursor.execute(
+                    'INSERT INTO categories (name, parent_id, sort_order) VALUES (?, ?, ?)',
+                    (name, parent_id, self.category_sort)
+                )
+                category_id = created[key] = cursor.lastrowid
+            parent_id = category_id
+        return parent_id
+
+    def flush(self):
+        """在一个写事务中写入当前批次"""
+        if not self.batch:
+            return
+        cursor = self.conn.cursor()
+        created = {}
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            rows = []
+            for title, url, icon, description, path, is_hidden in self.batch:
+                category_id = self._category_id(cursor, path, created)
+                sort_order = self.link_sort[category_id] = self.link_sort.get(category_id, 0) + 1
+                rows.append((title, url, icon, description, category_id, is_hidden, sort_order))
+            cursor.executemany(
+                '''INSERT INTO links (title, url, icon, description, category_id, is_hidden, sort_order)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                rows
+            )
+            bump_version(cursor, 'content')
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        self.categories.update(created)
+        self.stats['categories_created'] += len(created)
+        self.stats['imported'] += len(rows)
+        self.batch = []
+
+    def close(self):
+        self.conn.close()
+
+class NetscapeBookmarkParser(HTMLParser):
+    """流式解析浏览器导出的 Netscape 书签 HTML（<DT><H3> 为文件夹，<DT><A> 为链接，<DD> 为描述）"""
+
+    def __init__(self, importer):
+        super().__init__(convert_charrefs=True)
+        self.importer = importer
+        self.path = []            # 当前所在的 <DL> 层级，None 表示不计入分类的层级
+        self._folder = None       # 刚读完的 <H3>，随后的 <DL> 即为它的内容
+        self._capture = None      # 正在收集文本的标签：h3 / a / dd
+        self._text = []
+        self._attrs = {}
+        self._link = None         # 已读完、可能还有 <DD> 描述的链接
+
+    def _flush_link(self):
+        """提交上一条链接（<DD> 没有结束标签，遇到下一个标签即结束）"""
+        if self._capture == 'dd':
+            self._link['description'] = ''.join(self._text).strip() or None
+            self._capture = None
+        if self._link is not None:
+            self.importer.add_link(**self._link)
+            self._link = None
+
+    def handle_starttag(self, tag, attrs):
+        if self._capture == 'dd' or tag in ('dt', 'dl', 'h3', 'a'):
+            self._flush_link()
+        
+        if tag in ('h3', 'a'):
+            self._capture, self._text, self._attrs = tag, [], dict(attrs)
+        elif tag == 'dd' and self._link is not None:
+            self._capture, self._text = 'dd', []
+        elif tag == 'dl':
+            self.path.append(self._folder)
+            self._folder = None
+
+    def handle_endtag(self, tag):
+        if tag == 'h3' and self._capture == 'h3':
+            # 浏览器的“书签栏”文件夹不作为分类层级
+            toolbar = self._attrs.get('personal_toolbar_folder') == 'true'
+            self._folder = None if toolbar else ''.join(self._text).strip() or '未命名'
+            self._capture = None
+        elif tag == 'a' and self._capture == 'a':
+            self._link = {
+                'title': ''.join(self._text).strip(),
+                'url': self._attrs.get('href', ''),
+                'path': [name for name in self.path if name is not None],
+                'is_hidden': self._attrs.get('hidden') == '1',
+            }
+            self._capture = None
+        elif tag == 'dl':
+            self._flush_link()
+            if self.path:
+                self.path.pop()
+
+    def handle_data(self, data):
+        if self._capture:
+            self._text.append(data)
+
+    def close(self):
+        super().close()
+        self._flush_link()
+
+class JSONStream:
+    """在分块到达的文本上逐个解码 JSON 值，只在内存中保留当前值附近的内容"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """跳过空白，返回下一个字符（结束时返回空字符串）"""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in ' \t\r\n':
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f'JSON 格式错误，此处应为 {char!r}')
+        self._pos += 1
+
+    def value(self):
+        """解码下一个完整的值（数据不足时继续读取）"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._eof or not self._fill():
+                    raise
+                continue
+            # 数字可能正好在块边界被截断
+            if end == len(self._buf) and not self._eof and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def iter_array(self):
+        """逐个产出数组元素"""
+        self.expect('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ',':
+                self._pos += 1
+                continue
+            self.expect(']')
+            return
+
+def iter_json_records(chunks):
+    """流式解析 JSON 导入：{"categories": [...], "links": [...]} 或链接数组，逐条产出 (类型, 对象)"""
+    stream = JSONStream(chunks)
+    if stream.peek() == '[':
+        for item in stream.iter_array():
+            yield 'link', item
+        return
+    
+    stream.expect('{')
+    kinds = {'categories': 'category', 'links': 'link'}
+    while stream.peek() != '}':
+        key = stream.value()
+        stream.expect(':')
+        if key in kinds and stream.peek() == '[':
+            for item in stream.iter_array():
+                yield kinds[key], item
+        else:
+            stream.value()
+        if stream.peek() != ',':
+            break
+        stream.expect(',')
+    stream.expect('}')
+
+@app.route('/api/links/import', methods=['POST'])
+@require_auth
+def api_import_links():
+    """导入链接：浏览器书签 HTML 或本站导出的 JSON，请求体为文件内容"""
+    fmt = request.args.get('format') or ('json' if 'json' in (request.content_type or '') else 'html')
+    if fmt not in ('html', 'json'):
+        return jsonify({'error': '不支持的导入格式'}), 400
+    
+    started = time.perf_counter()
+    importer = LinkImporter()
+    try:
+        chunks = iter_upload_text(request.stream)
+        if fmt == 'html':
+            parser = NetscapeBookmarkParser(importer)
+            for chunk in chunks:
+                parser.feed(chunk)
+            parser.close()
+        else:
+            for kind, item in iter_json_records(chunks):
+                importer.add_json_record(kind, item)
+        importer.flush()
+    except ValueError as e:
+        # 出错前已解析的内容仍会写入
+        importer.flush()
+        return jsonify(dict(importer.stats, error=f'导入文件格式错误: {e}')), 400
+    finally:
+        importer.close()
+    
+    print(f"导入链接: {importer.stats}, 耗时 {time.perf_counter() - started:.2f}s")
+    return jsonify(dict(importer.stats, message='导入完成'))
+
+def buffer_chunks(parts, size=EXPORT_CHUNK_SIZE):
+    """把细碎的字符串合并成较大的块再写出"""
+    buf, length = [], 0
+    for part in parts:
+        buf.append(part)
+        length += len(part)
+        if length >= size:
+            yield ''.join(buf)
+            buf, length = [], 0
+    if buf:
+        yield ''.join(buf)
+
+EXPORT_LINK_COLUMNS = '''title, url, icon, description, category_id, is_hidden, sort_order,
+    CAST(strftime('%s', created_at) AS INTEGER) AS add_date'''
+
+def iter_export_html(cursor):
+    """生成 Netscape 书签 HTML，分类作为文件夹，逐行读取链接"""
+    yield (
+        '<!DOCTYPE NETSCAPE-Bookmark-file-1>\n'
+        '<!-- This is an automatically generated file. -->\n'
+        '<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">\n'
+        '<TITLE>Bookmarks</TITLE>\n<H1>Bookmarks</H1>\n<DL><p>\n'
+    )
+    categories = query_rows(cursor, CATEGORIES_SQL)
+    ids = {c['id'] for c in categories}
+    children = {}
+    for c in categories:
+        children.setdefault(c['parent_id'] if c['parent_id'] in ids else None, []).append(c)
+    
+    def links(sql, params, indent):
+        for row in cursor.connection.execute(sql, params):
+            attrs = f' ADD_DATE="{row["add_date"]}"' if row['add_date'] else ''
+            if row['is_hidden']:
+                attrs += ' HIDDEN="1"'
+            yield f'{indent}<DT><A HREF="{html.escape(row["url"])}"{attrs}>{html.escape(row["title"])}</A>\n'
+            if row['description']:
+                yield f'{indent}<DD>{html.escape(row["description"])}\n'
+    
+    visited = set()
+    
+    def folder(category, depth):
+        visited.add(category['id'])
+        indent = '    ' * depth
+        yield f'{indent}<DT><H3>{html.escape(category["name"])}</H3>\n{indent}<DL><p>\n'
+        yield from links(
+            f'SELECT {EXPORT_LINK_COLUMNS} FROM links WHERE category_id = ? ORDER BY sort_order, id',
+            (category['id'],), indent + '    '
+        )
+        for child in children.get(category['id'], []):
+            if child['id'] not in visited:
+                yield from folder(child, depth + 1)
+        yield f'{indent}</DL><p>\n'
+    
+    for category in children.get(None, []):
+        yield from folder(category, 1)
+    # parent_id 指向自身或形成环的分类无法从顶层到达，作为顶层文件夹导出
+    for category in categories:
+        if category['id'] not in visited:
+            yield from folder(category, 1)
+    yield from links(
+        f'''SELECT {EXPORT_LINK_COLUMNS} FROM links
+            WHERE category_id IS NULL OR category_id NOT IN (SELECT id FROM categories)
+            ORDER BY sort_order, id''',
+        (), '    '
+    )
+    yield '</DL><p>\n'
+
+def iter_export_json(cursor):
+    """生成 JSON：先分类后链接，每行一条记录"""
+    yield '{"format":"oasis-nav","version":1,"categories":[\n'
+    for i, row in enumerate(cursor.connection.execute(
+            'SELECT id, name, parent_id, sort_order FROM categories ORDER BY sort_order, id')):
+        yield (',\n' if i else '') + json.dumps(dict(row), ensure_ascii=False)
+    yield '\n],"links":[\n'
+    for i, row in enumerate(cursor.connection.execute(
+            'SELECT title, url, icon, description, category_id, is_hidden, sort_order FROM links ORDER BY sort_order, id')):
+        yield (',\n' if i else '') + json.dumps(dict(row), ensure_ascii=False)
+    yield '\n]}\n'
+
+@app.route('/api/links/export', methods=['GET'])
+@require_auth
+def api_export_links():
+    """导出全部分类和链接（含隐藏链接），边查询边输出"""
+    fmt = request.args.get('format', 'html')
+    if fmt not in ('html', 'json'):
+        return jsonify({'error': '不支持的导出格式'}), 400
+    
+    def generate():
+        # 在同一个读事务中导出，保证分类和链接一致
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute('BEGIN')
+        try:
+            parts = iter_export_html(cursor) if fmt == 'html' else iter_export_json(cursor)
+            for chunk in buffer_chunks(parts):
+                yield chunk.encode()
+        finally:
+            conn.commit()
+            conn.close()
+    
+    mimetype = 'text/html' if fmt == 'html' else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename=oasis-nav-links.{fmt}',
+        'Cache-Control': 'no-store'
+    })
+
 # ==================== 私密书签 API ====================
 
 @app.route('/bookmarks')
@@ -1080,14 +3672,12 @@ def api_bookmarks_auth():
     
     # 生成短期 token，有效期 5 分钟（仅用于当前页面会话，刷新后前端会清除）
     token = secrets.token_hex(32)
-    expires = datetime.now() + timedelta(minutes=5)
     
     # 如果开启 IP 绑定，记录 IP
     ip_binding_enabled = get_config('ip_binding_enabled') == '1'
-    active_tokens[f'bookmark_{token}'] = {
-        'expires': expires,
+    token_store.set('bookmark', token, {
         'ip': client_ip if ip_binding_enabled else None
-    }
+    }, 300)
     
     return jsonify({'token': token, 'expires_in': 300})
 
@@ -1102,32 +3692,33 @@ def api_update_bookmark_password():
     set_config('bookmark_password', hash_password(password))
     return jsonify({'message': '书签密码更新成功'})
 
+def check_bookmark_auth():
+    """检查书签访问权限，未授权时返回错误响应，否则返回 None"""
+    # 如果书签没有设置为隐藏，则无需认证
+    if get_config('bookmark_hidden') != '1':
+        return None
+    
+    # 书签已隐藏，需要验证 token
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    token_info = token_store.get('bookmark', token) if token else None
+    if token_info is None:
+        return jsonify({'error': '未授权'}), 401
+    
+    # 检查 IP 绑定（如果开启，且 token 有记录 IP）
+    ip_binding_enabled = get_config('ip_binding_enabled') == '1'
+    if ip_binding_enabled and token_info.get('ip'):  # 只有当 ip 值存在且不为 None 时才检查
+        client_ip = get_client_ip()
+        if token_info['ip'] != client_ip:
+            return jsonify({'error': 'IP 地址不匹配'}), 401
+    return None
+
 def require_bookmark_auth(f):
     """书签页认证装饰器（如果书签未隐藏则跳过认证）"""
     @wraps(f)
     def decorated(*args, **kwargs):
-        # 如果书签没有设置为隐藏，则无需认证
-        if get_config('bookmark_hidden') != '1':
-            return f(*args, **kwargs)
-        
-        # 书签已隐藏，需要验证 token
-        token = request.headers.get('Authorization', '').replace('Bearer ', '')
-        token_key = f'bookmark_{token}'
-        if not token or token_key not in active_tokens:
-            return jsonify({'error': '未授权'}), 401
-        
-        token_info = active_tokens[token_key]
-        if token_info['expires'] < datetime.now():
-            del active_tokens[token_key]
-            return jsonify({'error': 'Token 已过期'}), 401
-        
-        # 检查 IP 绑定（如果开启，且 token 有记录 IP）
-        ip_binding_enabled = get_config('ip_binding_enabled') == '1'
-        if ip_binding_enabled and token_info.get('ip'):  # 只有当 ip 值存在且不为 None 时才检查
-            client_ip = get_client_ip()
-            if token_info['ip'] != client_ip:
-                return jsonify({'error': 'IP 地址不匹配'}), 401
-        
+        error = check_bookmark_auth()
+        if error:
+            return error
         return f(*args, **kwargs)
     return decorated
 
@@ -1178,8 +3769,25 @@ def api_delete_bookmark(id):
 
 # ==================== 启动 ====================
 
-# 确保数据库初始化（无论是直接运行还是通过 gunicorn 启动）
-init_db()
+def startup():
+    """进程启动时的初始化"""
+    # 确保数据库初始化（无论是直接运行还是通过 gunicorn 启动）
+    init_db()
+    report_db_settings()
+    audit_query_plans()
+    
+    # 使用单文件图标缓存时，迁移旧的 .ico/.meta 文件
+    if isinstance(icon_store, SQLiteIconStore):
+        migrated = icon_store.migrate_from_files(ICON_CACHE_DIR)
+        if migrated:
+            print(f"已迁移 {migrated} 个图标缓存文件到 icons.db")
+    
+    # 启动时在后台预热所有链接的图标
+    start_boot_warmup()
+
+# 以 python app.py 运行时，密码校验子进程会以 __mp_main__ 名义重新导入本文件，子进程中不做初始化
+if __name__ != '__mp_main__':
+    startup()
 
 if __name__ == '__main__':
     # 通过环境变量控制是否开启 debug 模式
@@ -376,6 +376,11 @@ async function saveNewOrder(type) {
         if (res.ok) {
             // 更新本地数据
             loadData();
+        } else {
+            // 数据已在别处被修改（如链接已删除），重新加载以恢复正确顺序
+            const err = await res.json();
+            alert(err.error || '保存排序失败');
+            loadData();
         }
     } catch (err) {
         console.error('保存排序失败', err);
@@ -857,6 +862,55 @@ async function updateSiteSettings() {
     }
 }
 
+// ==================== 导入导出 ====================
+async function importLinks() {
+    const errorEl = document.getElementById('importError');
+    const successEl = document.getElementById('importSuccess');
+    const file = document.getElementById('importFile').files[0];
+    
+    errorEl.textContent = '';
+    successEl.classList.add('hidden');
+    if (!file) {
+        errorEl.textContent = '请选择要导入的文件';
+        return;
+    }
+    
+    // 直接上传文件内容，服务端边读边解析
+    const format = file.name.toLowerCase().endsWith('.json') ? 'json' : 'html';
+    try {
+        const res = await fetch(`/api/links/import?format=${format}`, {
+            method: 'POST',
+            headers: { 'Authorization': `Bearer ${token}` },
+            body: file
+        });
+        const result = await res.json();
+        
+        if (res.ok) {
+            successEl.textContent = `导入 ${result.imported} 条，新建分类 ${result.categories_created} 个，跳过重复 ${result.duplicates} 条、无效 ${result.invalid} 条`;
+            successEl.classList.remove('hidden');
+        } else {
+            errorEl.textContent = result.error || '导入失败';
+        }
+        loadData();
+    } catch (err) {
+        errorEl.textContent = '网络错误，请重试';
+    }
+}
+
+async function exportLinks(format) {
+    const res = await api(`/api/links/export?format=${format}`);
+    if (!res.ok) {
+        alert('导出失败');
+        return;
+    }
+    const url = URL.createObjectURL(await res.blob());
+    const a = document.createElement('a');
+    a.href = url;
+    a.download = `oasis-nav-links.${format}`;
+    a.click();
+    URL.revokeObjectURL(url);
+}
+
 async function updateHiddenPassword() {
     const password = document.getElementById('newHiddenPassword').value;
     const errorEl = document.getElementById('settingsError');
@@ -226,61 +226,55 @@ async function verifyBookmarkPassword() {
 }
 
 // ==================== 站点设置 ====================
-async function loadSiteSettings() {
-    try {
-        const res = await fetch('/api/site-settings');
-        const data = await res.json();
-        
-        document.getElementById('pageTitle').textContent = (data.site_title || 'Nav') + ' | 书签';
-        
-        if (data.favicon) {
-            document.getElementById('favicon').href = data.favicon;
-        }
-        
-        document.getElementById('siteIcon').textContent = data.site_icon || '🥭';
-        document.getElementById('siteTitle').textContent = data.site_title || 'Nav';
-        
-        const footerCustom = document.getElementById('footerCustom');
-        if (data.footer_text) {
-            footerCustom.innerHTML = data.footer_text;  // 支持 HTML 超链接
-            footerCustom.style.display = 'inline';
-        } else {
-            footerCustom.style.display = 'none';
-        }
-        
-        // 更新项目链接
-        const projectLink = document.getElementById('projectLink');
-        if (data.project_url) {
-            projectLink.href = data.project_url;
-        }
-        
-        // 获取书签隐藏配置
-        bookmarkHidden = data.bookmark_hidden || false;
-        
-        // 如果已经加载了数据，重新渲染导航栏以更新书签按钮
-        if (categories.length > 0) {
-            renderCategoryNav();
-        }
-    } catch (err) {
-        console.error('加载站点设置失败', err);
+function applySiteSettings(data) {
+    document.getElementById('pageTitle').textContent = (data.site_title || 'Nav') + ' | 书签';
+    
+    if (data.favicon) {
+        document.getElementById('favicon').href = data.favicon;
+    }
+    
+    document.getElementById('siteIcon').textContent = data.site_icon || '🥭';
+    document.getElementById('siteTitle').textContent = data.site_title || 'Nav';
+    
+    const footerCustom = document.getElementById('footerCustom');
+    if (data.footer_text) {
+        footerCustom.innerHTML = data.footer_text;  // 支持 HTML 超链接
+        footerCustom.style.display = 'inline';
+    } else {
+        footerCustom.style.display = 'none';
+    }
+    
+    // 更新项目链接
+    const projectLink = document.getElementById('projectLink');
+    if (data.project_url) {
+        projectLink.href = data.project_url;
     }
+    
+    // 获取书签隐藏配置
+    bookmarkHidden = data.bookmark_hidden || false;
 }
 
 // ==================== 数据加载 ====================
+function applyBootstrap(data) {
+    applySiteSettings(data.settings);
+    categories = data.categories;
+    links = data.links;
+    
+    renderCategoryNav();
+    renderContent();
+    // 数据刷新时保留当前的搜索
+    const input = document.getElementById('searchInput');
+    if (input && input.value.trim()) searchLinks();
+}
+
 async function loadData() {
     try {
-        const [catRes, linkRes] = await Promise.all([
-            fetch('/api/categories'),
-            fetch(showingHidden && hiddenToken 
-                ? `/api/links?show_hidden=1&hidden_token=${hiddenToken}` 
-                : '/api/links')
-        ]);
-        
-        categories = await catRes.json();
-        links = await linkRes.json();
-        
-        renderCategoryNav();
-        renderContent();
+        // 站点设置、分类和链接一次请求取回
+        const res = await fetch(showingHidden && hiddenToken 
+            ? `/api/bootstrap?show_hidden=1&hidden_token=${hiddenToken}` 
+            : '/api/bootstrap');
+        if (!res.ok) throw new Error(res.status);
+        applyBootstrap(await res.json());
     } catch (err) {
         document.getElementById('contentArea').innerHTML = 
             '<div class="empty-state">加载失败，请刷新重试</div>';
@@ -507,6 +501,92 @@ function renderContent() {
     }
     
     container.innerHTML = html || '<div class="empty-state">暂无链接</div>';
+    loadIcons(container);
+}
+
+// 图标代理地址（单个请求）
+function iconProxyUrl(iconUrl) {
+    return `/api/icon-proxy?url=${encodeURIComponent(iconUrl)}`;
+}
+
+// 本地保存批量接口返回的图标（POST 响应不会进入浏览器缓存），按插入顺序淘汰
+const ICON_STORE_KEY = 'nav-icons';
+const ICON_STORE_MAX_CHARS = 2 * 1024 * 1024;
+
+function readIconStore() {
+    try {
+        return JSON.parse(localStorage.getItem(ICON_STORE_KEY)) || {};
+    } catch {
+        return {};
+    }
+}
+
+function writeIconStore(store) {
+    const keys = Object.keys(store);
+    let size = keys.reduce((sum, key) => sum + key.length + (store[key].data || '').length, 0);
+    for (const key of keys) {
+        if (size <= ICON_STORE_MAX_CHARS) break;
+        size -= key.length + (store[key].data || '').length;
+        delete store[key];
+    }
+    try {
+        localStorage.setItem(ICON_STORE_KEY, JSON.stringify(store));
+    } catch {
+        // 超出存储配额时放弃本地保存
+        localStorage.removeItem(ICON_STORE_KEY);
+    }
+}
+
+// 批量加载图标：已缓存的直接使用 data URI（本地已有同一版本的不再下发），其余回退到单个代理请求
+async function loadIcons(container) {
+    const imgs = Array.from(container.querySelectorAll('img.icon[data-icon-url]'));
+    if (imgs.length === 0) return;
+    
+    const urls = [...new Set(imgs.map(img => img.dataset.iconUrl))];
+    const store = readIconStore();
+    let icons = {};
+    let changed = false;
+    
+    try {
+        // 服务器单次最多接受 500 个
+        for (let i = 0; i < urls.length; i += 500) {
+            const batch = urls.slice(i, i + 500);
+            const known = {};
+            batch.forEach(url => {
+                if (store[url]) known[url] = store[url].digest;
+            });
+            const res = await fetch('/api/icons/batch', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ urls: batch, known })
+            });
+            if (!res.ok) break;
+            const data = await res.json();
+            Object.assign(icons, data.icons);
+        }
+    } catch (err) {
+        console.error('批量加载图标失败', err);
+    }
+    
+    Object.entries(icons).forEach(([url, icon]) => {
+        if (icon.data && icon.digest) {
+            // 重新插入，使最近更新的排在后面
+            delete store[url];
+            store[url] = { digest: icon.digest, data: icon.data };
+            changed = true;
+        }
+    });
+    if (changed) writeIconStore(store);
+    
+    imgs.forEach(img => {
+        const url = img.dataset.iconUrl;
+        const icon = icons[url];
+        let src = icon && icon.data;
+        if (!src && icon && icon.digest && store[url] && store[url].digest === icon.digest) {
+            src = store[url].data;
+        }
+        img.src = src || iconProxyUrl(url);
+    });
 }
 
 // 规范化 URL
@@ -528,13 +608,11 @@ function getDomain(url) {
     }
 }
 
-// 渲染单个卡片
+// 渲染单个卡片（图标由 loadIcons 通过服务器代理批量加载，解决国外图标无法访问的问题）
 function renderCard(link) {
     const fullUrl = normalizeUrl(link.url);
     const domain = getDomain(link.url);
     const originalIconUrl = link.icon || `https://icons.duckduckgo.com/ip3/${domain}.ico`;
-    // 通过服务器代理获取图标（解决国外图标无法访问的问题）
-    const iconUrl = `/api/icon-proxy?url=${encodeURIComponent(originalIconUrl)}`;
     const hiddenClass = link.is_hidden ? 'hidden-item' : '';
     const firstChar = escapeHtml(link.title.charAt(0).toUpperCase());
     const tooltip = escapeHtml(link.description || link.title);
@@ -542,7 +620,7 @@ function renderCard(link) {
     return `
         <a href="${escapeAttr(fullUrl)}" target="_blank" class="nav-card ${hiddenClass}" 
            data-title="${escapeAttr(link.title)}" data-desc="${escapeAttr(link.description || '')}">
-            <img class="icon" src="${escapeAttr(iconUrl)}" alt="" 
+            <img class="icon" data-icon-url="${escapeAttr(originalIconUrl)}" alt="" 
                  onerror="this.style.display='none';this.nextElementSibling.style.display='flex';">
             <div class="icon-fallback" style="display:none;">${firstChar}</div>
             <span class="title">${escapeHtml(link.title)}</span>
@@ -552,26 +630,69 @@ function renderCard(link) {
 }
 
 // ==================== 搜索过滤 ====================
+const SEARCH_PAGE_SIZE = 60;
+let searchTimer = null;
+let searchSeq = 0;
+let searchState = { query: '', offset: 0 };
+
+// 输入防抖后交给服务端全文搜索
 function filterLinks() {
-    const filter = document.getElementById('searchInput').value.toUpperCase();
-    const cards = document.querySelectorAll('.nav-card');
-    const sections = document.querySelectorAll('.section-container');
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(searchLinks, 200);
+}
 
-    cards.forEach(card => {
-        const title = card.dataset.title || '';
-        const desc = card.dataset.desc || '';
-        
-        if (title.toUpperCase().includes(filter) || desc.toUpperCase().includes(filter)) {
-            card.style.display = '';
-        } else {
-            card.style.display = 'none';
-        }
-    });
+// 搜索第一页；append 为 true 时加载当前搜索的下一页
+async function searchLinks(append = false) {
+    const input = document.getElementById('searchInput');
+    const query = append ? searchState.query : (input ? input.value.trim() : '');
+    const seq = ++searchSeq;
+    if (!query) {
+        renderContent();
+        return;
+    }
+    
+    const offset = append ? searchState.offset : 0;
+    const params = new URLSearchParams({ q: query, limit: SEARCH_PAGE_SIZE, offset });
+    if (showingHidden && hiddenToken) {
+        params.set('show_hidden', '1');
+        params.set('hidden_token', hiddenToken);
+    }
+    try {
+        const res = await fetch(`/api/search?${params}`);
+        if (!res.ok) throw new Error(res.status);
+        const data = await res.json();
+        // 忽略已过期的搜索结果
+        if (seq !== searchSeq) return;
+        searchState = { query, offset: offset + data.results.length };
+        renderSearchResults(data.results, data.has_more, append);
+    } catch (err) {
+        console.error('搜索失败:', err);
+    }
+}
 
-    sections.forEach(section => {
-        const visibleCards = section.querySelectorAll('.nav-card:not([style*="display: none"])');
-        section.style.display = visibleCards.length === 0 ? 'none' : 'block';
-    });
+// 按相关度渲染搜索结果，还有更多时显示"加载更多"
+function renderSearchResults(results, hasMore, append) {
+    const container = document.getElementById('contentArea');
+    if (!append) {
+        if (results.length === 0) {
+            container.innerHTML = '<div class="empty-state">没有找到匹配的链接</div>';
+            return;
+        }
+        container.innerHTML = `
+            <section class="section-container search-results">
+                <h2 class="section-title">搜索结果</h2>
+                <div class="card-grid"></div>
+                <button class="load-more-btn" onclick="searchLinks(true)">加载更多</button>
+            </section>
+        `;
+    }
+    
+    // 只为新追加的卡片加载图标
+    const cards = document.createElement('div');
+    cards.innerHTML = results.map(link => renderCard(link)).join('');
+    loadIcons(cards);
+    container.querySelector('.search-results .card-grid').append(...cards.children);
+    container.querySelector('.load-more-btn').style.display = hasMore ? '' : 'none';
 }
 
 // ==================== 滚动监听 - 更新分类导航激活状态 ====================
@@ -634,6 +755,11 @@ function updateActiveCategoryOnScroll() {
 
 // ==================== 初始化 ====================
 document.addEventListener('DOMContentLoaded', () => {
-    loadSiteSettings();
-    loadData();
+    // 服务端已内嵌首屏数据时直接渲染，无需请求接口
+    const embedded = document.getElementById('bootstrapData');
+    if (embedded) {
+        applyBootstrap(JSON.parse(embedded.textContent));
+    } else {
+        loadData();
+    }
 });
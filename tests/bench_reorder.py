@@ -0,0 +1,71 @@
+"""链接排序的延迟基准：逐条 UPDATE 与 apply_reorder（单事务 executemany）对比
+
+用法: python tests/bench_reorder.py [N ...]    （默认 N = 10 100 500 5000）
+"""
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup(total):
+    # app 在导入时即初始化数据库，需先指向临时目录
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_PATH'] = os.path.join(tmp, 'data.db')
+    os.environ['ICON_CACHE_DIR'] = os.path.join(tmp, 'icon_cache')
+    os.environ['ICON_WARMUP_ON_START'] = '0'
+    sys.path.insert(0, ROOT)
+    import app
+
+    conn = app.get_db()
+    conn.executemany(
+        'INSERT INTO links (title, url, category_id, sort_order) VALUES (?, ?, 1, 0)',
+        [(f'link {i}', f'https://example.com/{i}') for i in range(total)]
+    )
+    conn.commit()
+    ids = [row['id'] for row in conn.execute('SELECT id FROM links ORDER BY id')]
+    conn.close()
+    return app, ids
+
+
+def reorder_loop(app, rows):
+    """原实现：每行一条 UPDATE"""
+    conn = app.get_db()
+    cursor = conn.cursor()
+    for sort_order, item_id in rows:
+        cursor.execute('UPDATE links SET sort_order = ? WHERE id = ?', (sort_order, item_id))
+    app.bump_version(cursor, 'content')
+    conn.commit()
+    conn.close()
+
+
+def measure(func, repeat):
+    """平均耗时（毫秒）"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    sizes = [int(n) for n in sys.argv[1:]] or [10, 100, 500, 5000]
+    app, ids = setup(max(sizes))
+    client = app.app.test_client()
+    client.post('/api/init', json={'username': 'admin', 'password': 'bench1234'})
+    token = client.post('/api/login', json={'username': 'admin', 'password': 'bench1234'}).json['token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    print(f"{'N':>6} {'逐条 UPDATE':>12} {'apply_reorder':>14} {'PUT 接口':>10}")
+    for n in sizes:
+        rows = [(i, ids[i]) for i in range(n)]
+        payload = {'orders': [{'id': item_id, 'sort_order': sort_order} for sort_order, item_id in rows]}
+        loop = measure(lambda: reorder_loop(app, rows), 20)
+        batch = measure(lambda: app.apply_reorder('links', rows), 20)
+        endpoint = measure(lambda: client.put('/api/links/reorder', json=payload, headers=headers), 5)
+        print(f'{n:>6} {loop:>10.2f}ms {batch:>12.2f}ms {endpoint:>8.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
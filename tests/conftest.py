@@ -0,0 +1,64 @@
+"""测试公共夹具：指向临时目录的 app 模块，以及本地上游桩服务器"""
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 1x1 PNG
+PNG_BODY = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c6360000002000001e221bc330000000049454e44ae426082'
+)
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    # app 在导入时即初始化数据库，需先指向临时目录
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_PATH'] = os.path.join(tmp, 'data.db')
+    os.environ['ICON_CACHE_DIR'] = os.path.join(tmp, 'icon_cache')
+    os.environ['ICON_WARMUP_ON_START'] = '0'
+    sys.path.insert(0, ROOT)
+    import app
+    return app
+
+
+@pytest.fixture(scope='session')
+def admin_headers(app_module):
+    """初始化管理员并登录，返回带 Bearer token 的请求头"""
+    client = app_module.app.test_client()
+    client.post('/api/init', json={'username': 'admin', 'password': 'test1234'})
+    response = client.post('/api/login', json={'username': 'admin', 'password': 'test1234'})
+    return {'Authorization': f"Bearer {response.json['token']}"}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """固定返回一个 PNG 的上游（HTTP/1.1 keep-alive）"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.hits += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(PNG_BODY)))
+        self.end_headers()
+        self.wfile.write(PNG_BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def upstream_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.hits = 0
+    server.url = f'http://127.0.0.1:{server.server_port}'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
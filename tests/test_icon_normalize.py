@@ -0,0 +1,41 @@
+"""图标规整：声明巨大尺寸的小文件不解码"""
+import io
+import struct
+import zlib
+
+import pytest
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def huge_png(width, height):
+    """文件很小但 IHDR 声明 width x height 的 RGBA PNG"""
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    idat = zlib.compress(b'\x00' * 1024)
+    return (b'\x89PNG\r\n\x1a\n' + png_chunk(b'IHDR', ihdr)
+            + png_chunk(b'IDAT', idat) + png_chunk(b'IEND', b''))
+
+
+@pytest.mark.filterwarnings('ignore::PIL.Image.DecompressionBombWarning')
+def test_oversized_image_is_not_decoded(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'ICON_NORMALIZE', True)
+    content = huge_png(12000, 12500)  # 1.5 亿像素，低于 Pillow 自带的解压炸弹阈值
+    assert app_module.transcode_icon(content, 64, 'png') is None
+
+    before = app_module.icon_normalize_stats['oversized']
+    assert app_module.normalize_icon(content, 'image/png') == (content, 'image/png')
+    assert app_module.icon_normalize_stats['oversized'] == before + 1
+
+
+def test_large_icon_is_shrunk(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'ICON_NORMALIZE', True)
+    out = io.BytesIO()
+    Image.new('RGBA', (512, 512), (255, 0, 0, 255)).save(out, 'PNG')
+    content, content_type = app_module.normalize_icon(out.getvalue(), 'image/png')
+    assert content_type == 'image/png'
+    with Image.open(io.BytesIO(content)) as img:
+        assert img.size == (64, 64)
@@ -0,0 +1,20 @@
+"""图标代理：响应体必须是 bytes（真实 WSGI 服务器不接受 bytearray 等其他类型）"""
+from wsgiref.validate import validator
+
+from werkzeug.test import Client
+
+from conftest import PNG_BODY
+
+
+def test_proxy_serves_bytes(app_module, upstream_server):
+    icon_url = f'{upstream_server.url}/favicon.png'
+    # wsgiref 的校验器与 gunicorn 等服务器一样要求响应体为 bytes
+    client = Client(validator(app_module.app))
+    for cache_status in ('MISS', 'HIT'):
+        response = client.get('/api/icon-proxy', query_string={'url': icon_url})
+        assert response.status_code == 200
+        assert response.headers['X-Cache'] == cache_status
+        assert response.get_data() == PNG_BODY
+        response.close()
+    assert upstream_server.hits == 1
+    assert type(app_module.load_icon_from_cache(icon_url)['content']) is bytes
@@ -0,0 +1,42 @@
+"""启动预热进度：没有链接时立即完成，进度对其他 worker 可见"""
+import time
+
+import pytest
+
+
+@pytest.fixture
+def no_links(app_module):
+    conn = app_module.get_db()
+    conn.execute('CREATE TABLE links_backup AS SELECT * FROM links')
+    conn.execute('DELETE FROM links')
+    conn.commit()
+    yield
+    conn.execute('INSERT INTO links SELECT * FROM links_backup')
+    conn.execute('DROP TABLE links_backup')
+    conn.commit()
+    conn.close()
+
+
+def test_boot_without_links_is_done(app_module, no_links):
+    warmer = app_module.IconWarmer(0)
+    warmer.warm_all_links()
+    boot = warmer.stats()['boot']
+    assert boot['state'] == 'done'
+    assert boot['total'] == 0
+
+
+def test_boot_progress_is_shared(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'ICON_WARMUP_ON_START', True)
+    owner = app_module.IconWarmer(2)
+    # 不访问外网，只验证进度记录
+    monkeypatch.setattr(owner, '_warm', lambda icon_url: 'skipped')
+    owner.warm_all_links()
+
+    other = app_module.IconWarmer(2)  # 另一个 worker：没有执行启动预热
+    deadline = time.time() + 5
+    while other.stats()['boot'].get('state') != 'done' and time.time() < deadline:
+        time.sleep(0.05)
+    boot = owner.stats()['boot']
+    assert boot['state'] == 'done'
+    assert boot['completed'] == boot['total'] > 0
+    assert other.stats()['boot'] == boot
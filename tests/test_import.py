@@ -0,0 +1,49 @@
+"""链接导入：格式错误的记录返回 400，且不影响已有数据"""
+import json
+
+import pytest
+
+
+def import_json(app_module, headers, data):
+    client = app_module.app.test_client()
+    return client.post('/api/links/import?format=json', data=json.dumps(data), headers=headers)
+
+
+def count_links(app_module):
+    conn = app_module.get_db()
+    count = conn.execute('SELECT COUNT(*) FROM links').fetchone()[0]
+    conn.close()
+    return count
+
+
+@pytest.mark.parametrize('record', [
+    {'title': 'x', 'url': 'https://d.example', 'description': ['x']},
+    {'title': 'x', 'url': 'https://d.example', 'icon': {'src': 'x'}},
+    {'title': 'x', 'url': 'https://d.example', 'category': ['a', ['b']]},
+    {'title': 'x', 'url': 'https://d.example', 'category_id': [1]},
+])
+def test_invalid_link_record_is_rejected(app_module, admin_headers, record):
+    before = count_links(app_module)
+    response = import_json(app_module, admin_headers, [record])
+    assert response.status_code == 400
+    assert count_links(app_module) == before
+
+
+@pytest.mark.parametrize('category', [{'id': [1], 'name': 'x'}, {'id': 1, 'parent_id': {}, 'name': 'x'}])
+def test_invalid_category_record_is_rejected(app_module, admin_headers, category):
+    response = import_json(app_module, admin_headers, {'categories': [category], 'links': []})
+    assert response.status_code == 400
+
+
+def test_valid_records_are_imported(app_module, admin_headers):
+    before = count_links(app_module)
+    response = import_json(app_module, admin_headers, {
+        'categories': [{'id': 1, 'name': '导入'}],
+        'links': [
+            {'title': 'a', 'url': 'https://a.example', 'category_id': 1, 'description': 'x'},
+            {'title': 'b', 'url': 'https://b.example', 'category': ['导入', '子分类'], 'icon': None},
+        ],
+    })
+    assert response.status_code == 200
+    assert response.json['imported'] == 2
+    assert count_links(app_module) == before + 2
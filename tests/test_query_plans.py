@@ -0,0 +1,20 @@
+"""热点查询的执行计划检查：查询退化为全表扫描或临时排序时测试失败"""
+
+
+def test_hot_queries_use_indexes(app_module):
+    app_module.init_db()
+    assert app_module.audit_query_plans() == 0
+
+
+def test_missing_index_is_reported(app_module):
+    conn = app_module.get_db()
+    conn.execute('DROP INDEX idx_categories_sort')
+    conn.commit()
+    conn.close()
+    try:
+        assert app_module.audit_query_plans() > 0
+    finally:
+        conn = app_module.get_db()
+        conn.execute('CREATE INDEX idx_categories_sort ON categories (sort_order, id)')
+        conn.commit()
+        conn.close()
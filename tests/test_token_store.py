@@ -0,0 +1,177 @@
+"""Token 存储：三种后端的过期、计数、登录锁定，以及按命名空间的上限与清理"""
+import time
+
+import pytest
+
+
+class Clock:
+    """可手动拨动的时钟，替换 time.time"""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class FakeRedis:
+    """进程内的 Redis 替身，只实现 RedisTokenStore 用到的命令"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.data = {}  # {name: (value, expires_at 或 None)}
+
+    def _alive(self, name):
+        item = self.data.get(name)
+        if item and item[1] is not None and item[1] <= self.clock():
+            del self.data[name]
+            return None
+        return item
+
+    def get(self, name):
+        item = self._alive(name)
+        return item[0] if item else None
+
+    def set(self, name, value, ex=None):
+        self.data[name] = (value.encode(), self.clock() + ex if ex else None)
+
+    def delete(self, name):
+        self.data.pop(name, None)
+
+    def incr(self, name):
+        item = self._alive(name)
+        count = int(item[0]) + 1 if item else 1
+        self.data[name] = (str(count).encode(), item[1] if item else None)
+        return count
+
+    def expire(self, name, seconds):
+        item = self._alive(name)
+        if item:
+            self.data[name] = (item[0], self.clock() + seconds)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, 'time', clock)
+    return clock
+
+
+def make_store(app_module, backend, clock, max_entries=3):
+    if backend == 'memory':
+        return app_module.MemoryTokenStore(max_entries)
+    if backend == 'sqlite':
+        conn = app_module.get_db()
+        conn.execute('DELETE FROM tokens')
+        conn.commit()
+        conn.close()
+        return app_module.SQLiteTokenStore(max_entries)
+    return app_module.RedisTokenStore(client=FakeRedis(clock))
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'redis'])
+def store(request, app_module, clock):
+    return make_store(app_module, request.param, clock)
+
+
+# Redis 的过期与淘汰由服务端负责，只测试本地实现的两种后端
+@pytest.fixture(params=['memory', 'sqlite'])
+def local_store(request, app_module, clock):
+    return make_store(app_module, request.param, clock)
+
+
+def test_get_set_and_expiry(store, clock):
+    store.set('token', 'abc', {'user': 'admin'}, 60)
+    assert store.get('token', 'abc') == {'user': 'admin'}
+    assert store.get('csrf', 'abc') is None
+    clock.advance(61)
+    assert store.get('token', 'abc') is None
+
+
+def test_delete(store):
+    store.set('token', 'abc', True, 60)
+    store.delete('token', 'abc')
+    assert store.get('token', 'abc') is None
+
+
+def test_incr_resets_after_ttl(store, clock):
+    assert [store.incr('login_fail', '1.2.3.4', 60) for _ in range(3)] == [1, 2, 3]
+    clock.advance(30)
+    assert store.incr('login_fail', '1.2.3.4', 60) == 4
+    clock.advance(31)
+    assert store.incr('login_fail', '1.2.3.4', 60) == 1
+
+
+def test_login_lockout(store, clock, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'token_store', store)
+    ip = '10.0.0.1'
+    for _ in range(app_module.MAX_LOGIN_ATTEMPTS - 1):
+        app_module.record_login_failure(ip)
+    assert app_module.check_login_limit(ip)[0]
+    app_module.record_login_failure(ip)
+    allowed, message = app_module.check_login_limit(ip)
+    assert not allowed and message
+    # 其他 IP 不受影响
+    assert app_module.check_login_limit('10.0.0.2')[0]
+    clock.advance(app_module.LOCKOUT_DURATION * 60 + 1)
+    assert app_module.check_login_limit(ip)[0]
+
+
+def test_namespaces_evict_independently(local_store, clock):
+    local_store.set('token', 'admin', {'user': 'admin'}, 3600)
+    local_store.set('csrf', 'form', True, 3600)
+    for i in range(20):
+        clock.advance(1)
+        local_store.incr('login_fail', f'10.0.0.{i}', 900)
+    local_store.sweep()
+    assert local_store.get('token', 'admin') == {'user': 'admin'}
+    assert local_store.get('csrf', 'form') is True
+    assert local_store.stats()['sizes']['login_fail'] == 3
+
+
+def test_eviction_is_lru(local_store, clock):
+    for key in ('a', 'b', 'c'):
+        local_store.set('token', key, key, 3600)
+        clock.advance(61)
+    local_store.get('token', 'a')
+    clock.advance(61)
+    local_store.set('token', 'd', 'd', 3600)
+    local_store.sweep()
+    assert local_store.get('token', 'a') == 'a'
+    assert local_store.get('token', 'b') is None
+    assert local_store.get('token', 'd') == 'd'
+
+
+def test_cap_holds_without_sweep(local_store, clock):
+    for i in range(10):
+        clock.advance(1)
+        local_store.set('token', f'k{i}', i, 3600)
+        local_store.incr('login_fail', f'10.0.0.{i}', 900)
+    sizes = local_store.stats()['sizes']
+    assert sizes['token'] == 3 and sizes['login_fail'] == 3
+    assert local_store.get('token', 'k9') == 9
+
+
+def test_hidden_tokens_do_not_evict_admin_sessions(app_module, admin_headers, monkeypatch):
+    monkeypatch.setattr(app_module, 'token_store', app_module.MemoryTokenStore(3))
+    client = app_module.app.test_client()
+    token = client.post('/api/login', json={'username': 'admin', 'password': 'test1234'}).json['token']
+    for _ in range(5):
+        response = client.post('/api/verify-hidden', json={'password': 'test1234'})
+        assert response.status_code == 200
+    assert app_module.token_store.get('token', token) is not None
+    assert app_module.token_store.stats()['sizes']['hidden'] == 3
+
+
+def test_sweep_removes_expired(local_store, clock):
+    local_store.set('token', 'short', True, 10)
+    local_store.set('token', 'long', True, 100)
+    local_store.incr('login_fail', '1.2.3.4', 10)
+    clock.advance(20)
+    local_store.sweep()
+    stats = local_store.stats()
+    assert stats['size'] == 1
+    assert stats['expired'] == 2
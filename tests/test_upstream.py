@@ -0,0 +1,15 @@
+"""上游客户端：同一主机的请求复用 keep-alive 连接"""
+
+
+def test_requests_reuse_one_connection(app_module, upstream_server):
+    client = app_module.UpstreamClient(pool_hosts=4, pool_size=2, connect_timeout=3, read_timeout=5)
+    for i in range(8):
+        # 与 download_icon 相同的用法：流式读取，退出 with 时归还连接
+        with client.get(f'{upstream_server.url}/icon{i}.png', stream=True) as response:
+            assert response.status_code == 200
+            response.content
+    stats = client.stats()
+    assert upstream_server.hits == 8
+    assert stats['requests'] == 8
+    assert stats['connections_opened'] == 1
+    assert stats['connection_reuse_ratio'] == 0.875